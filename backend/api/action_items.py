@@ -1,81 +1,216 @@
 """
 Action items management system.
 Stores action items created from coach suggestions.
+
+Items are persisted as an append-only JSON Lines log: every mutation appends
+one record ({"op": "create" | "update" | "delete", ...}) and the log is
+folded into the current item list on load. The log is compacted (rewritten
+as one create record per live item) once it grows well past the live size.
 """
 import json
+import os
+import secrets
+import threading
 from pathlib import Path
 from datetime import datetime
 from typing import List, Dict, Any
 from django.conf import settings
 
-ACTIONS_FILE = settings.LOCAL_DIR / 'action_items.json'
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
-def load_actions() -> List[Dict[str, Any]]:
-    """Load all action items."""
-    if not ACTIONS_FILE.exists():
-        return []
-    
+ACTIONS_FILE = settings.LOCAL_DIR / 'action_items.jsonl'
+# Pre-log storage format (a single JSON array); read once to migrate
+LEGACY_ACTIONS_FILE = settings.LOCAL_DIR / 'action_items.json'
+
+# Compact once the log holds this many records per live item
+COMPACT_RATIO = 10
+# ...but never bother for logs shorter than this
+COMPACT_MIN_RECORDS = 100
+
+# Action items keyed by id (dicts keep insertion order, so this doubles as
+# the ordered list). Reloaded only when the log's mtime changes. Callers get
+# copies, so changing a returned item never touches the cache.
+_cache = {'mtime': None, 'by_id': None, 'records': 0}
+_lock = threading.Lock()
+
+def _dumps(obj) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj).encode('utf-8')
+
+def _loads(data: bytes):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def _file_mtime():
+    """Return the mtime (ns) of the actions log, or None if it doesn't exist."""
+    try:
+        return os.stat(ACTIONS_FILE).st_mtime_ns
+    except OSError:
+        return None
+
+def _read_log():
+    """Fold the log into an id -> action dict. Returns (by_id, record_count)."""
+    by_id = {}
+    records = 0
+    with open(ACTIONS_FILE, 'rb') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                record = _loads(line)
+            except ValueError:
+                # Torn last line from an interrupted append
+                continue
+            records += 1
+            op = record.get('op')
+            if op == 'create':
+                action = record['action']
+                by_id[action['id']] = action
+            elif op == 'update':
+                action = by_id.get(record['id'])
+                if action is not None:
+                    action.update(record['fields'])
+            elif op == 'delete':
+                by_id.pop(record['id'], None)
+    return by_id, records
+
+def _load_legacy() -> List[Dict[str, Any]]:
+    """Read action items from the old single-array JSON file."""
     try:
-        with open(ACTIONS_FILE, 'r') as f:
-            return json.load(f)
+        with open(LEGACY_ACTIONS_FILE, 'rb') as f:
+            return _loads(f.read())
     except Exception:
         return []
 
-def save_actions(actions: List[Dict[str, Any]]):
-    """Save all action items."""
+def _load_cached() -> Dict[str, Dict[str, Any]]:
+    """Return the cached id -> action index, re-reading the log only if it changed."""
+    mtime = _file_mtime()
+    if _cache['by_id'] is None or mtime != _cache['mtime']:
+        if mtime is None:
+            by_id = {a['id']: a for a in _load_legacy()}
+            if by_id:
+                # Migrate to the log format; the legacy file is left in place
+                _compact(by_id)
+                return _cache['by_id']
+            records = 0
+        else:
+            by_id, records = _read_log()
+        _cache['by_id'] = by_id
+        _cache['records'] = records
+        _cache['mtime'] = mtime
+    return _cache['by_id']
+
+def _append(*records: Dict[str, Any]):
+    """Append records to the log and compact it if it has grown too long."""
     ACTIONS_FILE.parent.mkdir(parents=True, exist_ok=True)
-    with open(ACTIONS_FILE, 'w') as f:
-        json.dump(actions, f, indent=2)
+    data = b''.join(_dumps(record) + b'\n' for record in records)
+    try:
+        with open(ACTIONS_FILE, 'a+b') as f:
+            if f.seek(0, os.SEEK_END) > 0:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b'\n':
+                    # End a line torn by an interrupted append, so these
+                    # records don't get glued onto it and lost with it
+                    data = b'\n' + data
+            f.write(data)
+    except Exception:
+        # Drop the in-memory copy so the next call re-reads what is on disk
+        _cache['by_id'] = None
+        raise
+    _cache['records'] += len(records)
+    _cache['mtime'] = _file_mtime()
+
+    by_id = _cache['by_id']
+    if _cache['records'] > max(COMPACT_RATIO * len(by_id), COMPACT_MIN_RECORDS):
+        _compact(by_id)
+
+def _compact(by_id: Dict[str, Dict[str, Any]]):
+    """Rewrite the log as one create record per live action item."""
+    ACTIONS_FILE.parent.mkdir(parents=True, exist_ok=True)
+    data = b''.join(_dumps({'op': 'create', 'action': a}) + b'\n' for a in by_id.values())
+    # Write to a temp file and swap it in so readers never see a partial log.
+    # No fsync: a lost write on power failure is acceptable for action items.
+    tmp_path = ACTIONS_FILE.with_suffix('.jsonl.tmp')
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, ACTIONS_FILE)
+    _cache['by_id'] = by_id
+    _cache['records'] = len(by_id)
+    _cache['mtime'] = _file_mtime()
+
+def load_actions() -> List[Dict[str, Any]]:
+    """Load all action items."""
+    with _lock:
+        try:
+            return [dict(a) for a in _load_cached().values()]
+        except Exception:
+            return []
+
+def save_actions(actions: List[Dict[str, Any]]):
+    """Save all action items, replacing whatever is stored."""
+    with _lock:
+        _compact({a['id']: a for a in actions})
+
+def new_action_id() -> str:
+    """Generate a unique action id without needing the current action list."""
+    return f"action_{int(datetime.now().timestamp())}_{secrets.token_hex(4)}"
 
 def create_action(text: str, source_entry_id: str = None, source_query: str = None) -> Dict[str, Any]:
     """Create a new action item."""
-    actions = load_actions()
-    
-    action = {
-        'id': f"action_{len(actions)}_{int(datetime.now().timestamp())}",
-        'text': text,
-        'created_at': datetime.now().isoformat(),
-        'completed': False,
-        'completed_at': None,
-        'source_entry_id': source_entry_id,
-        'source_query': source_query
-    }
-    
-    actions.append(action)
-    save_actions(actions)
-    return action
+    with _lock:
+        by_id = _load_cached()
+
+        action = {
+            'id': new_action_id(),
+            'text': text,
+            'created_at': datetime.now().isoformat(),
+            'completed': False,
+            'completed_at': None,
+            'source_entry_id': source_entry_id,
+            'source_query': source_query
+        }
+
+        by_id[action['id']] = action
+        _append({'op': 'create', 'action': action})
+        return dict(action)
 
 def get_actions(completed: bool = None) -> List[Dict[str, Any]]:
     """Get action items, optionally filtered by completion status."""
-    actions = load_actions()
-    
+    with _lock:
+        actions = [dict(a) for a in _load_cached().values()]
+
     if completed is None:
         return actions
-    
+
     return [a for a in actions if a.get('completed', False) == completed]
 
 def update_action(action_id: str, completed: bool = None, text: str = None) -> Dict[str, Any]:
     """Update an action item."""
-    actions = load_actions()
-    
-    for action in actions:
-        if action['id'] == action_id:
-            if completed is not None:
-                action['completed'] = completed
-                if completed:
-                    action['completed_at'] = datetime.now().isoformat()
-                else:
-                    action['completed_at'] = None
-            if text is not None:
-                action['text'] = text
-            save_actions(actions)
-            return action
-    
-    raise ValueError(f"Action {action_id} not found")
+    with _lock:
+        by_id = _load_cached()
+        action = by_id.get(action_id)
+        if action is None:
+            raise ValueError(f"Action {action_id} not found")
+
+        fields = {}
+        if completed is not None:
+            fields['completed'] = completed
+            fields['completed_at'] = datetime.now().isoformat() if completed else None
+        if text is not None:
+            fields['text'] = text
+        if fields:
+            action.update(fields)
+            _append({'op': 'update', 'id': action_id, 'fields': fields})
+        return dict(action)
 
 def delete_action(action_id: str):
     """Delete an action item."""
-    actions = load_actions()
-    actions = [a for a in actions if a['id'] != action_id]
-    save_actions(actions)
-
+    with _lock:
+        by_id = _load_cached()
+        if by_id.pop(action_id, None) is not None:
+            _append({'op': 'delete', 'id': action_id})
@@ -1,20 +1,35 @@
 """
 Django app configuration for API app.
-Loads models at startup in the main thread.
+Loads the LLM at startup in the main thread and warms the RAG system in the background.
 """
 from django.apps import AppConfig
 import logging
+import threading
 
 logger = logging.getLogger(__name__)
 
 
+def _warm_rag_system():
+    """Initialize the shared RAG system (runs in a background thread)."""
+    try:
+        from .views import get_rag_system
+        get_rag_system()
+        logger.info("[AppConfig] ✅ RAG system initialized successfully")
+    except Exception as rag_error:
+        # Don't fail startup; get_rag_system() will retry on first use
+        error_msg = str(rag_error)
+        if 'meta tensor' in error_msg.lower():
+            logger.warning("[AppConfig] ⚠️ RAG system has meta tensor issue (will use fallback)")
+        else:
+            logger.warning(f"[AppConfig] ⚠️ RAG system initialization failed: {rag_error}")
+
+
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
     
     def ready(self):
         """Called when Django starts. Load models in main thread here."""
-        import threading
         import traceback
         
         # Only load in main thread (not in worker threads)
@@ -38,22 +53,10 @@ class ApiConfig(AppConfig):
                 logger.error(f"[AppConfig] Error loading LLM model: {e}")
                 logger.error(f"[AppConfig] Traceback: {traceback.format_exc()}")
             
-            # Try to load embedding model (but don't fail if it doesn't work)
-            # The RAG system will handle this gracefully
-            try:
-                from .rag_system import RAGSystem
-                # Just initialize to trigger loading, but don't fail if it errors
-                try:
-                    rag = RAGSystem()
-                    logger.info("[AppConfig] ✅ RAG system initialized successfully")
-                except Exception as rag_error:
-                    error_msg = str(rag_error)
-                    if 'meta tensor' in error_msg.lower():
-                        logger.warning("[AppConfig] ⚠️ RAG system has meta tensor issue (will use fallback)")
-                    else:
-                        logger.warning(f"[AppConfig] ⚠️ RAG system initialization failed: {rag_error}")
-            except Exception as e:
-                logger.warning(f"[AppConfig] ⚠️ Could not initialize RAG system: {e}")
+            # Build the RAG system (embedding model + index) in the background so
+            # startup isn't blocked on it. Unlike llama-cpp, this has no main-thread
+            # requirement; views.get_rag_system() holds requests until it's ready.
+            threading.Thread(target=_warm_rag_system, name='rag-warmup', daemon=True).start()
         else:
             logger.debug("[AppConfig] Not in main thread, skipping model loading")
 
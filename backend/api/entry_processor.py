@@ -1,53 +1,104 @@
 import json
-from typing import Dict, Any
-from textblob import TextBlob
+import re
+from dataclasses import dataclass
+from typing import Dict, Any, List, Optional
+from textblob.en.sentiments import PatternAnalyzer
+
+# (theme, keywords) pairs; order decides ties between equally scored themes
+THEME_KEYWORDS = (
+    ('work', frozenset({'work', 'project', 'meeting', 'deadline', 'task'})),
+    ('health', frozenset({'exercise', 'sleep', 'energy', 'tired', 'rest'})),
+    ('relationships', frozenset({'friend', 'family', 'partner', 'talk', 'connect'})),
+    ('growth', frozenset({'learn', 'read', 'practice', 'improve', 'skill'})),
+    ('stress', frozenset({'stress', 'anxious', 'worried', 'pressure', 'overwhelm'})),
+    ('gratitude', frozenset({'grateful', 'thankful', 'appreciate', 'blessed', 'lucky'})),
+)
+
+# Shared analyzer: this is what TextBlob(text).sentiment uses under the hood,
+# without building a full blob (tokenizer, tagger, parser) for every entry
+_SENTIMENT_ANALYZER = PatternAnalyzer()
+
+# Keywords with a leading space, matched against a " token token " string so
+# a keyword must start a word: 'framework' no longer counts as 'work', while
+# inflections like 'workout' or 'stressed' still do.
+_WORD_RE = re.compile(r'[a-z]+')
+_THEME_PREFIXES = tuple(
+    (theme, tuple(' ' + kw for kw in keywords)) for theme, keywords in THEME_KEYWORDS
+)
+
+@dataclass(slots=True)
+class EntryView:
+    """The entry fields EntryProcessor reads, pulled out of the dict once."""
+    free_text: str
+    long_reflection: str
+    emotion: Optional[str]
+    energy: int
+    showed_up: bool
+    text: str  # free_text and long_reflection combined
+    text_lower: str
+
+    @classmethod
+    def from_entry(cls, entry: Dict[str, Any]) -> 'EntryView':
+        free_text = entry.get('free_text', '')
+        long_reflection = entry.get('long_reflection', '')
+        text = f"{free_text} {long_reflection}"
+        return cls(
+            free_text=free_text,
+            long_reflection=long_reflection,
+            emotion=entry.get('emotion'),
+            energy=entry.get('energy', 5),
+            showed_up=entry.get('showed_up', False),
+            text=text,
+            text_lower=text.lower()
+        )
 
 class EntryProcessor:
     """Process entries to derive additional fields."""
     
     def process_entry(self, entry: Dict[str, Any]) -> Dict[str, Any]:
         """Process an entry and add derived fields."""
+        view = EntryView.from_entry(entry)
+        
+        # Entries with only structured fields skip the text analysis entirely
+        has_text = bool(view.text.strip())
+        
         derived = {
-            'sentiment': self._get_sentiment(entry),
-            'themes': self._extract_themes(entry),
-            'flags': self._detect_flags(entry),
-            'summary': self._generate_summary(entry)
+            'sentiment': self._get_sentiment(view) if has_text else {'polarity': 0.0, 'subjectivity': 0.0},
+            'themes': self._extract_themes(view) if has_text else [],
+            'flags': self._detect_flags(view),
+            'summary': self._generate_summary(view)
         }
         
         entry['derived'] = derived
         return entry
     
-    def _get_sentiment(self, entry: Dict[str, Any]) -> Dict[str, float]:
+    def process_entries(self, entries: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Process a batch of entries (e.g. when re-deriving historical data)."""
+        return [self.process_entry(entry) for entry in entries]
+    
+    def _get_sentiment(self, view: EntryView) -> Dict[str, float]:
         """Get sentiment polarity from text."""
-        text = f"{entry.get('free_text', '')} {entry.get('long_reflection', '')}"
+        text = view.text
         if not text.strip():
             return {'polarity': 0.0, 'subjectivity': 0.0}
         
         try:
-            blob = TextBlob(text)
+            sentiment = _SENTIMENT_ANALYZER.analyze(text)
             return {
-                'polarity': float(blob.sentiment.polarity),
-                'subjectivity': float(blob.sentiment.subjectivity)
+                'polarity': float(sentiment.polarity),
+                'subjectivity': float(sentiment.subjectivity)
             }
         except Exception:
             return {'polarity': 0.0, 'subjectivity': 0.0}
     
-    def _extract_themes(self, entry: Dict[str, Any]) -> list:
+    def _extract_themes(self, view: EntryView) -> list:
         """Extract top themes using simple keyword matching."""
-        text = f"{entry.get('free_text', '')} {entry.get('long_reflection', '')}".lower()
-        
-        theme_keywords = {
-            'work': ['work', 'project', 'meeting', 'deadline', 'task'],
-            'health': ['exercise', 'sleep', 'energy', 'tired', 'rest'],
-            'relationships': ['friend', 'family', 'partner', 'talk', 'connect'],
-            'growth': ['learn', 'read', 'practice', 'improve', 'skill'],
-            'stress': ['stress', 'anxious', 'worried', 'pressure', 'overwhelm'],
-            'gratitude': ['grateful', 'thankful', 'appreciate', 'blessed', 'lucky']
-        }
+        canonical = ' ' + ' '.join(_WORD_RE.findall(view.text_lower)) + ' '
         
+        # Score = number of distinct keywords present
         theme_scores = {}
-        for theme, keywords in theme_keywords.items():
-            score = sum(1 for keyword in keywords if keyword in text)
+        for theme, prefixes in _THEME_PREFIXES:
+            score = sum(1 for prefix in prefixes if prefix in canonical)
             if score > 0:
                 theme_scores[theme] = score
         
@@ -55,16 +106,15 @@ class EntryProcessor:
         sorted_themes = sorted(theme_scores.items(), key=lambda x: x[1], reverse=True)
         return [theme for theme, _ in sorted_themes[:3]]
     
-    def _detect_flags(self, entry: Dict[str, Any]) -> list:
+    def _detect_flags(self, view: EntryView) -> list:
         """Detect patterns that might be flags."""
         flags = []
         
-        text = entry.get('free_text', '').lower() + ' ' + entry.get('long_reflection', '').lower()
-        emotion = entry.get('emotion', '').lower()
-        energy = entry.get('energy', 5)
+        emotion = (view.emotion or '').lower()
+        energy = view.energy
         
-        # Evening procrastination (check for keywords in text)
-        if ('procrastinat' in text or 'late night' in text) and energy < 4:
+        # Evening procrastination (check the cheap energy test before scanning text)
+        if energy < 4 and ('procrastinat' in view.text_lower or 'late night' in view.text_lower):
             flags.append('evening_procrastination')
         
         # Low energy pattern
@@ -76,17 +126,17 @@ class EntryProcessor:
             flags.append('high_stress')
         
         # Consistency concern
-        if not entry.get('showed_up', False) and energy < 5:
+        if not view.showed_up and energy < 5:
             flags.append('consistency_concern')
         
         return flags
     
-    def _generate_summary(self, entry: Dict[str, Any]) -> str:
+    def _generate_summary(self, view: EntryView) -> str:
         """Generate a one-sentence summary."""
-        emotion = entry.get('emotion', 'neutral')
-        energy = entry.get('energy', 5)
-        showed_up = entry.get('showed_up', False)
-        free_text = entry.get('free_text', '')
+        emotion = view.emotion if view.emotion is not None else 'neutral'
+        energy = view.energy
+        showed_up = view.showed_up
+        free_text = view.free_text
         
         parts = []
         parts.append(f"Felt {emotion}")
@@ -8,12 +8,28 @@ are preserved so the rest of the codebase doesn't need to change.
 """
 import os
 import sys
+import json
+import time
+import inspect
 import logging
+import platform
+import queue
+import threading
+import traceback
 import warnings
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Any
+from types import MappingProxyType
+from typing import Any, Mapping
 from django.conf import settings
 
+from .prompt_utils import estimate_tokens
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # Suppress deprecation warnings
 warnings.filterwarnings("ignore", category=DeprecationWarning)
 
@@ -22,32 +38,347 @@ logger = logging.getLogger(__name__)
 # Global model instance cache (for local llama / GPT4All)
 _model_instance = None
 _model_path = None
-_model_lock = None
+# Context window of _model_instance, read once when it loads
+_model_n_ctx = None
+_model_lock = threading.Lock()
+# llama.cpp already spreads one generation over n_threads cores, so local
+# inference is funnelled through a single worker rather than one per request
+_inference_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='llm-infer')
 
 # Gemini client cache
 _gemini_client = None
+# google.genai.types and the (immutable) thinking config, set on first Gemini call
+_gemini_types = None
+_gemini_thinking_config = None
+
+# Parsed config.json cache (reloaded only when the file's mtime changes)
+_config_cache = None
+_config_mtime = None
+
+# Whether calls go to Gemini; computed on first use
+_gemini_mode = None
+# Whether a local model file exists to fall back to when Gemini fails
+_local_model_available = None
+
+DEFAULT_MODEL_PATH = 'local/models/llama_model.bin'
+
+# Stop sequences for local completions (VERDICT/EVIDENCE/ACTION deliberately not included)
+STOP_SEQUENCES = ["\n\n\n", "User:", "Context:"]
+
+# Tokens kept free between the prompt and generation budget (covers BOS etc.)
+PROMPT_TOKEN_MARGIN = 32
+
+# Fewest characters per token we expect from a real tokenizer; used to size
+# the prompt when the model's tokenizer is unavailable
+CHARS_PER_TOKEN_LOWER_BOUND = 2.5
+
+# Text extractors for the completion choice schemas we know about, in the
+# order they are tried
+_CHOICE_EXTRACTORS = (
+    ('text', lambda choice: choice['text'].strip()),
+    ('content', lambda choice: choice['content'].strip()),
+    ('message', lambda choice: choice['message'].get('content', '').strip()),
+)
+# Extractor that matched the last response; llama-cpp always returns the same
+# schema, so later calls go straight to it
+_RESPONSE_EXTRACTOR = None
+
+
+def _extract_choice_text(choice) -> str:
+    """Pull the generated text out of a completion choice."""
+    global _RESPONSE_EXTRACTOR
+    if _RESPONSE_EXTRACTOR is not None:
+        try:
+            return _RESPONSE_EXTRACTOR(choice)
+        except (KeyError, TypeError, AttributeError):
+            # Schema changed; fall through and re-specialize
+            _RESPONSE_EXTRACTOR = None
+
+    if isinstance(choice, str):
+        return choice.strip()
+    for key, extractor in _CHOICE_EXTRACTORS:
+        if key in choice:
+            if key == 'message' and not isinstance(choice['message'], dict):
+                continue
+            _RESPONSE_EXTRACTOR = extractor
+            return extractor(choice)
+    return ''
+
+
+def _fit_prompt_to_context(prompt: str, context_window: int, gen_tokens: int) -> str:
+    """
+    Trim a prompt (keeping its end, the most recent context) so it fits the
+    context window alongside gen_tokens of output, without a tokenizer.
+    """
+    safety_buffer = max(200, int(context_window * 0.2))
+    budget_tokens = max(0, context_window - gen_tokens - safety_buffer)
+    max_chars = int(budget_tokens * CHARS_PER_TOKEN_LOWER_BOUND)
+    if len(prompt) > max_chars:
+        logger.warning(
+            f"[LLM] Truncating prompt from {len(prompt)} to {max_chars} chars "
+            f"(context window {context_window}, generating {gen_tokens})"
+        )
+        prompt = prompt[len(prompt) - max_chars:]
+    prompt_tokens = estimate_tokens(prompt)
+    if prompt_tokens + gen_tokens > context_window:
+        # Token-dense text (symbols, non-English) can beat the chars-per-token bound
+        logger.warning(f"[LLM] Prompt may still overflow: ~{prompt_tokens} tokens + {gen_tokens} > {context_window}")
+    return prompt
+
+
+# Cores available to llama.cpp for generation
+CPU_THREADS = os.cpu_count() or 8
+
+# Llama constructor params to try, fastest first
+# Optimized for speed: more threads, smaller context, batch processing
+# (n_batch == n_ctx so any prompt that fits is prefilled in one batch)
+# Multiple combinations handle different model formats
+# (read-only so the shared constants can't be mutated by a caller)
+LOAD_ATTEMPTS = (
+    MappingProxyType({
+        'n_ctx': 1024,
+        'n_threads': CPU_THREADS,
+        'n_batch': 1024,
+        'use_mmap': True,
+        'use_mlock': False,
+        'verbose': False
+    }),
+    MappingProxyType({
+        'n_ctx': 1024,
+        'n_threads': 4,
+        'use_mmap': True,
+        'verbose': False
+    }),
+    MappingProxyType({
+        'n_ctx': 512,
+        'n_threads': 2,
+        'verbose': False
+    })
+)
+
+# Tried ahead of LOAD_ATTEMPTS when llama.cpp can offload to CUDA/Metal/ROCm
+GPU_LOAD_ATTEMPT = MappingProxyType({
+    'n_ctx': 2048,
+    'n_gpu_layers': -1,
+    'n_threads': CPU_THREADS,
+    'n_batch': 2048,
+    'use_mmap': True,
+    'verbose': False
+})
+
+# Default memory for saved KV states of earlier prompts, when enabled via
+# models.llm_prompt_cache_mb (see _attach_prompt_cache). Off by default
+PROMPT_CACHE_MB = 0
+
+# Fused attention and an int8 (GGML_TYPE_Q8_0 = 8) KV cache for the GPU path.
+# Only passed when the installed llama-cpp-python accepts them.
+GPU_ATTENTION_PARAMS = MappingProxyType({
+    'flash_attn': True,
+    'offload_kqv': True,
+    'type_k': 8,
+    'type_v': 8
+})
+
+
+def _prepare_local_prompt(model_instance, prompt: str, max_tokens_to_generate: int):
+    """
+    Fit a prompt into the loaded model's context window.
+
+    Returns (completion_prompt, prompt_tokens, context_window). When the
+    model's tokenizer works, completion_prompt is the token list itself so
+    create_completion doesn't tokenize again; otherwise it is the
+    (char-truncated) prompt string.
+    """
+    # Context window is fixed for the model's lifetime, so it is read once at load
+    context_window = _model_n_ctx or _read_n_ctx(model_instance)
+
+    # Preferred: count and slice real tokens with the model's own tokenizer
+    prompt_token_ids = None
+    try:
+        prompt_token_ids = model_instance.tokenize(prompt.encode('utf-8'))
+    except Exception as tokenize_error:
+        logger.warning(f"[LLM] Tokenizer unavailable ({tokenize_error}), falling back to char-based estimates")
+
+    if prompt_token_ids is not None:
+        max_prompt_tokens = context_window - max_tokens_to_generate - PROMPT_TOKEN_MARGIN
+        if len(prompt_token_ids) > max_prompt_tokens:
+            logger.warning(
+                f"[LLM] Prompt is {len(prompt_token_ids)} tokens, truncating to {max_prompt_tokens} "
+                f"(context window {context_window}, generating {max_tokens_to_generate})"
+            )
+            # Keep the last part (most recent context), plus the leading BOS token
+            head = prompt_token_ids[:1] if prompt_token_ids[0] == model_instance.token_bos() else []
+            keep = max_prompt_tokens - len(head)
+            prompt_token_ids = head + prompt_token_ids[len(prompt_token_ids) - keep:]
+        return prompt_token_ids, len(prompt_token_ids), context_window
+
+    prompt = _fit_prompt_to_context(prompt, context_window, max_tokens_to_generate)
+    # Same heuristic the truncation used, so no need to rescan the prompt
+    return prompt, int(len(prompt) / CHARS_PER_TOKEN_LOWER_BOUND), context_window
+
+
+def _gpu_offload_available() -> bool:
+    """Return True if llama.cpp can offload layers to a GPU on this machine."""
+    try:
+        import llama_cpp
+        supports_gpu = getattr(llama_cpp, 'llama_supports_gpu_offload', None)
+        if supports_gpu is not None:
+            return bool(supports_gpu())
+    except Exception:
+        pass
 
+    # Older llama-cpp-python builds lack the check; Apple Silicon builds use
+    # Metal. A visible CUDA device isn't enough: the default wheel is CPU-only
+    return sys.platform == 'darwin' and platform.machine() == 'arm64'
 
-def _get_model_lock():
-    """Get or create the model lock."""
-    global _model_lock
-    if _model_lock is None:
-        import threading
-        _model_lock = threading.Lock()
-    return _model_lock
+
+def _attach_prompt_cache(model):
+    """
+    Give the model an in-memory KV-state cache keyed by prompt tokens, if
+    models.llm_prompt_cache_mb is set.
+
+    Off by default: llama.cpp already reuses the prefix shared with the last
+    prompt it evaluated, and with a cache attached create_completion saves
+    the full KV state (hundreds of MB for a 7B model) after every call. It
+    only pays off when different prompts alternate.
+    """
+    try:
+        # Read defensively: the model is already loaded, and a config problem
+        # shouldn't throw it away (see _get_model_path)
+        cache_mb = _get_config().get('models', {}).get('llm_prompt_cache_mb', PROMPT_CACHE_MB)
+        if not cache_mb:
+            return
+        from llama_cpp import LlamaRAMCache
+        model.set_cache(LlamaRAMCache(capacity_bytes=int(cache_mb) << 20))
+        logger.info("[LLM] Prompt cache enabled (%s MB)", cache_mb)
+    except Exception as e:
+        logger.debug("[LLM] Prompt cache unavailable: %s", e)
+
+
+def _load_llama(full_model_path: Path):
+    """
+    Construct a Llama instance for the given model file.
+
+    Tries GPU params first when offload is available, then LOAD_ATTEMPTS in
+    order. Raises if every attempt fails.
+    """
+    from llama_cpp import Llama
+
+    load_attempts = list(LOAD_ATTEMPTS)
+    if _gpu_offload_available():
+        logger.info("[LLM] GPU offload available, trying full offload first")
+        gpu_attempts = [GPU_LOAD_ATTEMPT]
+        # Older builds don't know these params, so check the constructor first
+        supported = inspect.signature(Llama.__init__).parameters
+        attention_params = {k: v for k, v in GPU_ATTENTION_PARAMS.items() if k in supported}
+        if attention_params:
+            gpu_attempts.insert(0, {**GPU_LOAD_ATTEMPT, **attention_params})
+        load_attempts = gpu_attempts + load_attempts
+
+    last_error = None
+    for i, params in enumerate(load_attempts):
+        try:
+            logger.info("[LLM] Loading model attempt %d with params: %s", i + 1, list(params))
+            model = Llama(
+                model_path=str(full_model_path),
+                **params
+            )
+        except Exception as e:
+            error_msg = str(e) if str(e) else repr(e)
+            last_error = e
+            logger.warning(f"[LLM] Load attempt {i+1} failed: {error_msg}")
+            logger.debug("[LLM] Full traceback:", exc_info=True)
+            continue
+
+        logger.info("[LLM] ✅ Model loaded successfully on attempt %d", i + 1)
+        _attach_prompt_cache(model)
+        return model
+
+    error_details = str(last_error) if last_error else "Unknown error"
+    error_type = type(last_error).__name__ if last_error else "Exception"
+    raise RuntimeError(
+        f"Failed to load local model after {len(load_attempts)} attempts. "
+        f"Last error ({error_type}): {error_details}"
+    )
+
+
+def _read_config() -> dict:
+    """Read and parse config.json in one read (uses orjson when available)."""
+    data = Path(settings.CONFIG_FILE).read_bytes()
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _freeze(value):
+    """Recursively wrap dicts in read-only proxies and turn lists into tuples."""
+    if isinstance(value, dict):
+        return MappingProxyType({k: _freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def _get_config() -> Mapping[str, Any]:
+    """
+    Return the parsed config, re-reading config.json only if it changed.
+
+    The result is shared between callers, so it is returned read-only.
+    """
+    global _config_cache, _config_mtime
+    mtime = os.stat(settings.CONFIG_FILE).st_mtime_ns
+    if _config_cache is None or mtime != _config_mtime:
+        _config_cache = _freeze(_read_config())
+        _config_mtime = mtime
+    return _config_cache
+
+
+def _get_model_path() -> str:
+    """Return the configured local model path (relative to the project root)."""
+    try:
+        return _get_config()['models'].get('llm_model_path', DEFAULT_MODEL_PATH)
+    except Exception as e:
+        logger.warning(f"[LLM] Error loading config: {e}, using default local path")
+        return DEFAULT_MODEL_PATH
+
+
+def reset_llm_config():
+    """Forget the cached config and Gemini mode so they are re-read on next use."""
+    global _config_cache, _config_mtime, _gemini_mode, _local_model_available
+    _config_cache = None
+    _config_mtime = None
+    _gemini_mode = None
+    _local_model_available = None
+
+
+def _has_local_model() -> bool:
+    """Return True if a local model is loaded or its file exists. Checked once per process."""
+    global _local_model_available
+    if _local_model_available is None:
+        _local_model_available = (
+            _model_instance is not None
+            or (Path(settings.CONFIG_FILE).parent / _get_model_path()).exists()
+        )
+    return _local_model_available
 
 
 def _using_gemini() -> bool:
-    """Return True if Gemini should be used (based on GEMINI_API_KEY env var or config.json)."""
+    """Return True if Gemini should be used. Decided once per process (see reset_llm_config)."""
+    global _gemini_mode
+    if _gemini_mode is None:
+        _gemini_mode = _detect_gemini()
+    return _gemini_mode
+
+
+def _detect_gemini() -> bool:
+    """Return True if GEMINI_API_KEY is set in the environment or config.json."""
     # Check environment variable first
     if os.getenv("GEMINI_API_KEY"):
         return True
     
     # Fallback: check config.json
     try:
-        import json
-        with open(settings.CONFIG_FILE, 'r') as f:
-            config = json.load(f)
+        config = _get_config()
         api_key = config.get('models', {}).get('gemini_api_key', '')
         if api_key and api_key.strip() and api_key != 'YOUR_GEMINI_API_KEY_HERE':
             # Set it in environment for this session
@@ -77,6 +408,28 @@ def _get_gemini_client():
     return _gemini_client
 
 
+def _get_gemini_types():
+    """
+    Import google.genai.types once and build the shared ThinkingConfig.
+    Imported lazily so the module still imports without google-genai.
+    """
+    global _gemini_types, _gemini_thinking_config
+    if _gemini_types is None:
+        from google.genai import types
+        _gemini_thinking_config = types.ThinkingConfig(thinking_budget=0)
+        _gemini_types = types
+    return _gemini_types
+
+
+def _read_n_ctx(model_instance) -> int:
+    """Return a loaded model's context window size, or 1024 if it can't be read."""
+    try:
+        return model_instance.n_ctx()
+    except Exception:
+        logger.warning("[LLM] Could not get context window size, using default: 1024")
+        return 1024
+
+
 def get_model_context_window() -> int:
     """
     Get the context window size of the loaded model.
@@ -84,25 +437,19 @@ def get_model_context_window() -> int:
     For Gemini we return a safe default (8192 tokens).
     For local llama we inspect the model if available, else 1024.
     """
-    global _model_instance
-
     if _using_gemini():
         # Gemini 2.5 models support much larger windows, but 8192 is a safe, conservative default.
         return 8192
 
     # Don't try to load model here if we're in a background thread
     # Just return default
-    import threading
     if threading.current_thread() is not threading.main_thread():
         logger.debug("[LLM] get_model_context_window() called from background thread, returning default")
         return 1024
 
     # We're in main thread
-    if _model_instance is not None:
-        try:
-            return _model_instance.n_ctx()
-        except Exception:
-            pass
+    if _model_n_ctx is not None:
+        return _model_n_ctx
 
     # Model not loaded yet - return default
     # The model should be loaded via ensure_model_loaded() before this is called
@@ -117,12 +464,16 @@ def ensure_model_loaded():
     - For Gemini: we just create the client once and return True.
     - For local llama: we load the GGUF model in the main thread (existing behavior).
     """
-    global _model_instance, _model_path
+    global _model_instance, _model_path, _model_n_ctx
 
     if _using_gemini():
         try:
             _ = _get_gemini_client()
+            # Preload the request types so the first query doesn't pay for the import
+            _get_gemini_types()
             logger.debug("[LLM] Gemini client ready (no local model load needed)")
+            if not _has_local_model():
+                logger.info("[LLM] No local model file; Gemini errors will not fall back to it")
             return True
         except Exception:
             # If Gemini fails to initialize, signal failure so callers can fall back or handle error.
@@ -133,20 +484,16 @@ def ensure_model_loaded():
         return True  # Already loaded
 
     # Check if we're in the main thread
-    import threading
     if threading.current_thread() is not threading.main_thread():
         logger.warning("[LLM] ensure_model_loaded() called from background thread. Model must be loaded in main thread.")
         return False
 
-    # Try to load the model directly (extract the loading logic from call_local_llm)
+    # Load the model directly (same loader as call_local_llm)
     try:
         logger.info("[LLM] ensure_model_loaded() - Starting model loading...")
 
         # Get model path from config
-        import json
-        with open(settings.CONFIG_FILE, 'r') as f:
-            config = json.load(f)
-        model_path = config['models'].get('llm_model_path', 'local/models/llama_model.bin')
+        model_path = _get_config()['models'].get('llm_model_path', DEFAULT_MODEL_PATH)
         project_root = Path(settings.CONFIG_FILE).parent
         full_model_path = project_root / model_path
 
@@ -154,69 +501,20 @@ def ensure_model_loaded():
             logger.error(f"[LLM] Model file not found at {full_model_path}")
             return False
 
-        logger.info(f"[LLM] Model file found at {full_model_path}, loading...")
+        logger.info("[LLM] Model file found at %s, loading...", full_model_path)
 
-        # Load model directly (same logic as in call_local_llm)
-        from llama_cpp import Llama
-        import warnings
-        warnings.filterwarnings("ignore", category=DeprecationWarning)
-
-        lock = _get_model_lock()
-        with lock:
+        with _model_lock:
             if _model_instance is None:
-                load_attempts = [
-                    {
-                        'n_ctx': 1024,
-                        'n_threads': 8,
-                        'n_batch': 512,
-                        'use_mmap': True,
-                        'use_mlock': False,
-                        'verbose': False
-                    },
-                    {
-                        'n_ctx': 1024,
-                        'n_threads': 4,
-                        'use_mmap': True,
-                        'verbose': False
-                    },
-                    {
-                        'n_ctx': 512,
-                        'n_threads': 2,
-                        'verbose': False
-                    }
-                ]
-
-                _model_instance = None
-                last_error = None
-
-                for i, params in enumerate(load_attempts):
-                    try:
-                        logger.info(f"[LLM] Loading model attempt {i+1} with params: {list(params.keys())}")
-                        _model_instance = Llama(
-                            model_path=str(full_model_path),
-                            **params
-                        )
-                        logger.info(f"[LLM] ✅ Model loaded successfully on attempt {i+1}")
-                        _model_path = str(full_model_path)
-                        return True
-                    except Exception as e:
-                        import traceback
-                        error_msg = str(e) if str(e) else repr(e)
-                        last_error = e
-                        logger.warning(f"[LLM] Load attempt {i+1} failed: {error_msg}")
-                        if _model_instance:
-                            try:
-                                del _model_instance
-                            except Exception:
-                                pass
-                            _model_instance = None
-                        continue
-
-                if _model_instance is None:
-                    error_details = str(last_error) if last_error else "Unknown error"
-                    error_type = type(last_error).__name__ if last_error else "Exception"
-                    logger.error(f"[LLM] ❌ Failed to load model after {len(load_attempts)} attempts. Last error ({error_type}): {error_details}")
+                try:
+                    _model_instance = _load_llama(full_model_path)
+                except ImportError:
+                    raise
+                except Exception as e:
+                    logger.error(f"[LLM] ❌ {e}")
                     return False
+                _model_path = str(full_model_path)
+                _model_n_ctx = _read_n_ctx(_model_instance)
+                return True
             else:
                 logger.debug("[LLM] Model already loaded (checked within lock)")
                 return True
@@ -224,12 +522,33 @@ def ensure_model_loaded():
         logger.error("[LLM] llama-cpp-python not available")
         return False
     except Exception as e:
-        import traceback
         logger.error(f"[LLM] ❌ Exception in ensure_model_loaded(): {e}")
         logger.error(f"[LLM] Traceback: {traceback.format_exc()}")
         return False
 
 
+def _gemini_request_config(max_tokens, temp: float, system_instruction: str = None):
+    """Build the GenerateContentConfig shared by plain and streamed Gemini calls."""
+    types = _gemini_types or _get_gemini_types()
+
+    # Optimize token usage: allow more tokens for 2-3 sentence responses
+    max_tokens = int(max_tokens) if max_tokens is not None else 384
+    max_tokens = max(1, min(max_tokens, 512))  # Cap at 512 for cost control
+
+    # Build config with token optimizations
+    config_kwargs = {
+        'temperature': float(temp),
+        'max_output_tokens': max_tokens,
+        'thinking_config': _gemini_thinking_config,  # Disable thinking for faster/cheaper responses
+    }
+
+    # Use system instruction if provided (more efficient than including in prompt)
+    if system_instruction:
+        config_kwargs['system_instruction'] = system_instruction
+
+    return types.GenerateContentConfig(**config_kwargs)
+
+
 def _call_gemini(prompt: str, max_tokens: int = 512, temp: float = 0.2, system_instruction: str = None) -> str:
     """
     Call Gemini using google-genai with token optimization.
@@ -242,33 +561,14 @@ def _call_gemini(prompt: str, max_tokens: int = 512, temp: float = 0.2, system_i
         temp: Temperature
         system_instruction: Optional system instruction (more token-efficient than including in prompt)
     """
-    logger.info(f"[LLM] Using Gemini (gemini-2.5-flash) with max_tokens={max_tokens}, temp={temp}")
+    logger.info("[LLM] Using Gemini (gemini-2.5-flash) with max_tokens=%s, temp=%s", max_tokens, temp)
     client = _get_gemini_client()
 
-    # Optimize token usage: allow more tokens for 2-3 sentence responses
-    max_tokens = int(max_tokens) if max_tokens is not None else 384
-    max_tokens = max(1, min(max_tokens, 512))  # Cap at 512 for cost control
-
     try:
-        # Import types lazily so the module still imports even if google-genai
-        # is not installed (until we actually try to use Gemini).
-        from google.genai import types
-
-        # Build config with token optimizations
-        config_kwargs = {
-            'temperature': float(temp),
-            'max_output_tokens': max_tokens,
-            'thinking_config': types.ThinkingConfig(thinking_budget=0),  # Disable thinking for faster/cheaper responses
-        }
-        
-        # Use system instruction if provided (more efficient than including in prompt)
-        if system_instruction:
-            config_kwargs['system_instruction'] = system_instruction
-
         response = client.models.generate_content(
             model="gemini-2.5-flash",
-            contents=prompt if not system_instruction else prompt,  # If system_instruction used, prompt is just user content
-            config=types.GenerateContentConfig(**config_kwargs),
+            contents=prompt,  # If system_instruction used, prompt is just user content
+            config=_gemini_request_config(max_tokens, temp, system_instruction),
         )
 
         # SDK exposes a convenient .text property
@@ -277,7 +577,7 @@ def _call_gemini(prompt: str, max_tokens: int = 512, temp: float = 0.2, system_i
             logger.error("[LLM] Empty text in Gemini response")
             raise ValueError("Empty response from Gemini")
         
-        logger.debug(f"[LLM] Gemini response length: {len(text)} chars")
+        logger.debug("[LLM] Gemini response length: %d chars", len(text))
         return text.strip()
     except Exception as e:
         logger.error(f"[LLM] Error calling Gemini: {e}", exc_info=True)
@@ -298,320 +598,124 @@ def call_local_llm(prompt: str, max_tokens: int = 512, temp: float = 0.2, system
         temp: Temperature
         system_instruction: Optional system instruction (used with Gemini for token efficiency)
     """
-    global _model_instance, _model_path
+    global _model_instance, _model_path, _model_n_ctx
 
-    logger.info(f"[LLM] Starting LLM call with max_tokens={max_tokens}, temp={temp}")
+    logger.info("[LLM] Starting LLM call with max_tokens=%s, temp=%s", max_tokens, temp)
 
     # Preferred path: Gemini
     if _using_gemini():
         try:
             return _call_gemini(prompt, max_tokens=max_tokens, temp=temp, system_instruction=system_instruction)
         except Exception:
-            # If Gemini fails for any reason, log and fall back to local model logic below
+            # Gemini-only deployments have no local model, so the fallback would only fail later
+            if not _has_local_model():
+                raise
+            # Otherwise log and fall back to local model logic below
             logger.warning("[LLM] Falling back to local model after Gemini error")
 
     # === Local llama / GPT4All path (unchanged behavior) ===
 
-    # Get model path from config
-    try:
-        import json
-        logger.debug("[LLM] Loading config file for local model...")
-        with open(settings.CONFIG_FILE, 'r') as f:
-            config = json.load(f)
-        model_path = config['models'].get('llm_model_path', 'local/models/llama_model.bin')
-        logger.debug(f"[LLM] Local model path from config: {model_path}")
-    except Exception as e:
-        logger.warning(f"[LLM] Error loading config: {e}, using default local path")
-        model_path = 'local/models/llama_model.bin'
-
-    # Resolve full path
-    project_root = Path(settings.CONFIG_FILE).parent
-    full_model_path = project_root / model_path
-    logger.debug(f"[LLM] Full local model path: {full_model_path}")
-
-    # Check if model exists
-    if not full_model_path.exists():
-        error_msg = f"LLM model file not found at {full_model_path}"
-        logger.error(f"[LLM] {error_msg}")
-        print("\n" + "=" * 70)
-        print("ERROR: LLM model file not found")
-        print("=" * 70)
-        print(f"Expected path: {full_model_path}")
-        print("\nTo download a model:")
-        print("1. Visit https://huggingface.co/models?library=gguf")
-        print("2. Download a compatible GGUF model (e.g., Mistral 7B, Llama 2 7B)")
-        print("3. Place it at:", full_model_path)
-        print("\nExample download command:")
-        print(f"  mkdir -p {full_model_path.parent}")
-        print(f"  wget -O {full_model_path} <MODEL_URL>")
-        print("\nExiting...")
-        print("=" * 70 + "\n")
-        raise FileNotFoundError(error_msg)
+    # Once a model is loaded, skip the config read, path resolution and stat
+    if _model_instance is not None:
+        # Only needed by the GPT4All fallback, which can't run with a llama model loaded
+        full_model_path = None
+    else:
+        # Get model path from config
+        model_path = _get_model_path()
+        logger.debug("[LLM] Local model path from config: %s", model_path)
+
+        # Resolve full path
+        project_root = Path(settings.CONFIG_FILE).parent
+        full_model_path = project_root / model_path
+        logger.debug("[LLM] Full local model path: %s", full_model_path)
+
+        # Check if model exists
+        if not full_model_path.exists():
+            error_msg = f"LLM model file not found at {full_model_path}"
+            logger.error(f"[LLM] {error_msg}")
+            print("\n" + "=" * 70)
+            print("ERROR: LLM model file not found")
+            print("=" * 70)
+            print(f"Expected path: {full_model_path}")
+            print("\nTo download a model:")
+            print("1. Visit https://huggingface.co/models?library=gguf")
+            print("2. Download a compatible GGUF model (e.g., Mistral 7B, Llama 2 7B)")
+            print("3. Place it at:", full_model_path)
+            print("\nExample download command:")
+            print(f"  mkdir -p {full_model_path.parent}")
+            print(f"  wget -O {full_model_path} <MODEL_URL>")
+            print("\nExiting...")
+            print("=" * 70 + "\n")
+            raise FileNotFoundError(error_msg)
 
     # Try llama-cpp-python first
     try:
-        from llama_cpp import Llama
-        import warnings
-        warnings.filterwarnings("ignore", category=DeprecationWarning)
+        import llama_cpp  # noqa: F401 - ImportError falls through to GPT4All below
 
-        # Reuse model instance if path hasn't changed (thread-safe)
+        # Reuse the loaded model instance
         # IMPORTANT: Model must be LOADED in main thread, but can be USED from any thread
-        import threading
-
-        lock = _get_model_lock()
-        with lock:
-            # Check if model is already loaded and path matches
-            if _model_instance is not None and _model_path == str(full_model_path):
-                logger.debug("[LLM] Reusing existing local model instance (already loaded)")
-                # Model is already loaded, we can use it from any thread
-            elif _model_instance is None or _model_path != str(full_model_path):
-                # Model needs to be loaded - this must happen in main thread
-                if threading.current_thread() is not threading.main_thread():
-                    error_msg = (
-                        "Model loading attempted from background thread. "
-                        "Model must be loaded in main thread. "
-                        "Please ensure AppConfig loaded the model at startup."
-                    )
-                    logger.error(f"[LLM] {error_msg}")
-                    logger.error(
-                        f"[LLM] Model instance: {_model_instance is not None}, "
-                        f"Path match: {_model_path == str(full_model_path) if _model_path else False}"
-                    )
-                    raise RuntimeError(error_msg)
-                logger.info(f"[LLM] Loading local model from {full_model_path}...")
-                try:
-                    # Load model in main thread only
-                    # Optimized for speed: more threads, smaller context, batch processing
-                    # Try multiple parameter combinations to handle different model formats
-                    load_attempts = [
-                        {
-                            'n_ctx': 1024,
-                            'n_threads': 8,
-                            'n_batch': 512,
-                            'use_mmap': True,
-                            'use_mlock': False,
-                            'verbose': False
-                        },
-                        {
-                            'n_ctx': 1024,
-                            'n_threads': 4,
-                            'use_mmap': True,
-                            'verbose': False
-                        },
-                        {
-                            'n_ctx': 512,
-                            'n_threads': 2,
-                            'verbose': False
-                        }
-                    ]
-
-                    _model_instance = None
-                    last_error = None
-
-                    for i, params in enumerate(load_attempts):
-                        try:
-                            logger.debug(f"[LLM] Attempt {i+1} to load local model with params: {list(params.keys())}")
-                            _model_instance = Llama(
-                                model_path=str(full_model_path),
-                                **params
-                            )
-                            logger.info(f"[LLM] Local model loaded successfully on attempt {i+1}")
-                            break
-                        except Exception as e:
-                            import traceback
-                            error_msg = str(e) if str(e) else repr(e)
-                            error_trace = traceback.format_exc()
-                            last_error = e
-                            logger.warning(f"[LLM] Local load attempt {i+1} failed: {error_msg}")
-                            logger.debug(f"[LLM] Full traceback: {error_trace}")
-                            if _model_instance:
-                                try:
-                                    del _model_instance
-                                except Exception:
-                                    pass
-                                _model_instance = None
-                            continue
-
-                    if _model_instance is None:
-                        error_details = str(last_error) if last_error else "Unknown error"
-                        error_type = type(last_error).__name__ if last_error else "Exception"
-                        raise Exception(
-                            f"Failed to load local model after {len(load_attempts)} attempts. "
-                            f"Last error ({error_type}): {error_details}"
+
+        # Fast path: once loaded, calls never touch the lock. The load itself
+        # uses double-checked locking so only one thread constructs the model.
+        # The global is read once into a local so a concurrent reset can't
+        # swap it out between the check and the use.
+        model_instance = _model_instance
+        if model_instance is not None:
+            logger.debug("[LLM] Reusing existing local model instance (already loaded)")
+        else:
+            with _model_lock:
+                model_instance = _model_instance
+                if model_instance is not None:
+                    logger.debug("[LLM] Model loaded by another thread, reusing it")
+                else:
+                    # Model needs to be loaded - this must happen in main thread
+                    if threading.current_thread() is not threading.main_thread():
+                        error_msg = (
+                            "Model loading attempted from background thread. "
+                            "Model must be loaded in main thread. "
+                            "Please ensure AppConfig loaded the model at startup."
                         )
-                    _model_path = str(full_model_path)
-                    logger.info("[LLM] Local model loaded successfully")
-                except (ValueError, IOError, OSError) as e:
-                    error_msg = str(e)
-                    if 'I/O operation on closed file' in error_msg or 'closed file' in error_msg.lower():
-                        logger.error("[LLM] File descriptor error - local model must be loaded in main thread")
+                        logger.error(f"[LLM] {error_msg}")
+                        raise RuntimeError(error_msg)
+                    if full_model_path is None:
+                        # Model was reset by a failed call since we checked above
+                        full_model_path = Path(settings.CONFIG_FILE).parent / _get_model_path()
+                    logger.info("[LLM] Loading local model from %s...", full_model_path)
+                    try:
                         _model_instance = None
-                        _model_path = None
-                        raise IOError("Local model loading failed. Please restart the server.")
-                    raise
+                        _model_instance = _load_llama(full_model_path)
+                        _model_path = str(full_model_path)
+                        _model_n_ctx = _read_n_ctx(_model_instance)
+                        model_instance = _model_instance
+                        logger.info("[LLM] Local model loaded successfully")
+                    except (ValueError, IOError, OSError) as e:
+                        error_msg = str(e)
+                        if 'I/O operation on closed file' in error_msg or 'closed file' in error_msg.lower():
+                            logger.error("[LLM] File descriptor error - local model must be loaded in main thread")
+                            _model_instance = None
+                            _model_path = None
+                            _model_n_ctx = None
+                            raise IOError("Local model loading failed. Please restart the server.")
+                        raise
 
         # Model is now loaded (either was already loaded or just loaded)
-        # Get a reference to the model instance (we're outside the lock now, but model is already loaded)
-        if _model_instance is None:
+        if model_instance is None:
             error_msg = "Local model instance is None after loading attempt. This should not happen."
             logger.error(f"[LLM] {error_msg}")
             raise RuntimeError(error_msg)
 
-        model_instance = _model_instance  # Local reference for clarity
-        logger.debug(f"[LLM] Generating completion with local model (prompt length: {len(prompt)} chars)...")
+        logger.debug("[LLM] Generating completion with local model (prompt length: %d chars)...", len(prompt))
         try:
-            import time
             start_time = time.time()
 
-            # Get actual context window size from model
-            try:
-                context_window = model_instance.n_ctx()
-            except Exception:
-                # Fallback if n_ctx() not available
-                context_window = 1024
-                logger.warning(f"[LLM] Could not get context window size, using default: {context_window}")
-
-            # Estimate tokens in prompt (be very conservative - use 3 chars per token)
-            # This is more conservative than the 4 chars/token estimate to account for tokenizer differences
-            from .prompt_utils import estimate_tokens
-            prompt_tokens = estimate_tokens(prompt)
-            # Use even more conservative estimate for safety (actual tokenizers often use more tokens)
-            conservative_prompt_tokens = len(prompt) // 3  # 3 chars per token is very conservative
-
-            # Check if prompt fits
             max_tokens_to_generate = min(max_tokens, 256)
-            total_needed = prompt_tokens + max_tokens_to_generate
-            conservative_total = conservative_prompt_tokens + max_tokens_to_generate
-
-            # Primary check: use actual token estimate (most accurate)
-            # Truncate if we exceed context window OR if we're close (within 10% safety margin)
-            # This accounts for token estimation inaccuracies
-            safety_margin = int(context_window * 0.1)  # 10% safety margin
-            needs_truncation = total_needed > (context_window - safety_margin)
-
-            # Secondary check: if conservative estimate also exceeds, definitely truncate
-            if not needs_truncation and conservative_total > context_window:
-                logger.warning(
-                    f"[LLM] Conservative estimate ({conservative_total}) exceeds context window ({context_window}), "
-                    f"but actual estimate ({total_needed}) fits. Truncating for safety."
-                )
-                needs_truncation = True
-
-            # Safety check: if prompt is extremely long (character-based), also check
-            # This is a fallback for cases where token estimation might be completely wrong
-            # Use 2.5 chars/token as a more realistic estimate (some models use fewer chars per token)
-            max_safe_chars = int((context_window - max_tokens_to_generate - safety_margin) * 2.5)
-            char_based_check = len(prompt) > max_safe_chars
-
-            # Truncate if:
-            # 1. Token-based check says we need truncation, OR
-            # 2. Both character-based check AND conservative estimate exceed limits
-            if needs_truncation or (char_based_check and conservative_total > context_window):
-                if needs_truncation:
-                    logger.error(
-                        f"[LLM] Prompt too long: {prompt_tokens} tokens + {max_tokens_to_generate} generation = "
-                        f"{total_needed} tokens, but context window is {context_window}"
-                    )
-                else:
-                    logger.warning(
-                        f"[LLM] Prompt may be too long (char-based check: {len(prompt)} chars > {max_safe_chars}, "
-                        f"conservative: {conservative_total} > {context_window}). Truncating for safety."
-                    )
-                logger.info("[LLM] Attempting truncation...")
-
-                # Emergency truncation - be VERY conservative
-                # Reserve space for generation + large safety buffer (at least 200 tokens)
-                # Account for token estimation inaccuracies
-                safety_buffer = max(200, int(context_window * 0.2))  # 20% safety buffer or 200 tokens, whichever is larger
-                available_for_prompt = context_window - max_tokens_to_generate - safety_buffer
-                # Use 2.5 chars per token (realistic estimate) to ensure we fit
-                # This is more conservative than 4 chars/token but less than 3
-                max_prompt_chars = int(available_for_prompt * 2.5)
-
-                if len(prompt) > max_prompt_chars:
-                    logger.warning(
-                        f"[LLM] Emergency truncating prompt from {len(prompt)} chars to {max_prompt_chars} chars"
-                    )
-                    # Keep the last part (most recent context)
-                    prompt = prompt[-max_prompt_chars:]
-
-                    # Re-estimate after truncation
-                    prompt_tokens = estimate_tokens(prompt)
-                    total_needed = prompt_tokens + max_tokens_to_generate
-
-                    # Re-estimate with conservative method
-                    conservative_prompt_tokens = len(prompt) // 3
-                    conservative_total = conservative_prompt_tokens + max_tokens_to_generate
-
-                    if conservative_total > context_window or total_needed > (context_window - safety_margin):
-                        # Still too long - even more aggressive truncation
-                        logger.error(
-                            f"[LLM] Still too long after truncation: {prompt_tokens} tokens "
-                            f"(conservative: {conservative_prompt_tokens}). Reducing further..."
-                        )
-                        safety_buffer = max(250, int(context_window * 0.25))  # 25% safety buffer
-                        available_for_prompt = context_window - max_tokens_to_generate - safety_buffer
-                        max_prompt_chars = int(available_for_prompt * 2.5)  # Use 2.5 chars per token
-                        prompt = prompt[-max_prompt_chars:]
-                        logger.warning(f"[LLM] Aggressively truncated to {len(prompt)} chars")
-
-                        # Final check
-                        prompt_tokens = estimate_tokens(prompt)
-                        conservative_prompt_tokens = len(prompt) // 3
-                        total_needed = prompt_tokens + max_tokens_to_generate
-                        conservative_total = conservative_prompt_tokens + max_tokens_to_generate
-
-                        if conservative_total > context_window or total_needed > (context_window - safety_margin):
-                            logger.error(
-                                f"[LLM] CRITICAL: Prompt still too long ({prompt_tokens} tokens, "
-                                f"conservative: {conservative_prompt_tokens}). Forcing maximum truncation."
-                            )
-                            # Last resort: keep only what absolutely fits with maximum safety buffer
-                            safety_buffer = max(300, int(context_window * 0.3))  # 30% safety buffer
-                            max_prompt_chars = int(
-                                (context_window - max_tokens_to_generate - safety_buffer) * 2.5
-                            )  # 2.5 chars per token
-                            prompt = prompt[-max_prompt_chars:]
-                            logger.error(f"[LLM] Forced truncation to {len(prompt)} chars")
-
-                    logger.debug(
-                        f"[LLM] Final prompt length: {len(prompt)} chars "
-                        f"(estimated {estimate_tokens(prompt)} tokens)"
-                    )
-
-            # Final safety check: ensure we never exceed context window
-            # Re-estimate one more time to be absolutely sure
-            final_prompt_tokens = estimate_tokens(prompt)
-            final_total = final_prompt_tokens + max_tokens_to_generate
-            final_conservative = (len(prompt) // 2.5) + max_tokens_to_generate  # Use 2.5 chars/token
-
-            if final_total > context_window or final_conservative > context_window:
-                logger.error(
-                    "[LLM] FINAL CHECK FAILED: Prompt still too long after all truncation attempts!"
-                )
-                logger.error(
-                    f"[LLM] Final estimate: {final_prompt_tokens} tokens + {max_tokens_to_generate} = {final_total} tokens"
-                )
-                logger.error(
-                    f"[LLM] Conservative: {final_conservative} tokens, Context window: {context_window}"
-                )
-                # Force maximum truncation
-                max_safe_tokens = context_window - max_tokens_to_generate - 50  # 50 token absolute minimum buffer
-                max_prompt_chars = int(max_safe_tokens * 2.5)  # Very conservative
-                if len(prompt) > max_prompt_chars:
-                    logger.error(
-                        f"[LLM] Forcing absolute maximum truncation to {max_prompt_chars} chars"
-                    )
-                    prompt = prompt[-max_prompt_chars:]
-                    final_prompt_tokens = estimate_tokens(prompt)
-                    logger.warning(
-                        f"[LLM] After absolute truncation: {len(prompt)} chars, ~{final_prompt_tokens} tokens"
-                    )
+            completion_prompt, prompt_tokens, context_window = _prepare_local_prompt(
+                model_instance, prompt, max_tokens_to_generate
+            )
 
             logger.debug(
-                f"[LLM] Calling create_completion with prompt: {len(prompt)} chars, "
-                f"~{estimate_tokens(prompt)} tokens, max_tokens={max_tokens_to_generate}, "
-                f"context_window={context_window}"
+                "[LLM] Calling create_completion with prompt: ~%d tokens, max_tokens=%d, context_window=%d",
+                prompt_tokens, max_tokens_to_generate, context_window
             )
             logger.info("[LLM] 🚀 Starting local model inference...")
 
@@ -621,14 +725,15 @@ def call_local_llm(prompt: str, max_tokens: int = 512, temp: float = 0.2, system
             # llama_cpp internal cleanup (temporary objects) and can be safely ignored.
             # They don't affect the model inference or the response.
             try:
-                response = model_instance.create_completion(
-                    prompt=prompt,
+                response = _inference_pool.submit(
+                    model_instance.create_completion,
+                    prompt=completion_prompt,
                     max_tokens=max_tokens_to_generate,
                     temperature=temp,
-                    stop=["\n\n\n", "User:", "Context:"],  # Removed VERDICT, EVIDENCE, ACTION from stops
-                )
+                    stop=STOP_SEQUENCES,
+                ).result()
                 elapsed = time.time() - start_time
-                logger.info(f"[LLM] ✅ Local model inference completed in {elapsed:.2f} seconds")
+                logger.info("[LLM] ✅ Local model inference completed in %.2f seconds", elapsed)
                 logger.debug("[LLM] Response received from local model, processing...")
             except Exception as inference_error:
                 elapsed = time.time() - start_time
@@ -650,26 +755,15 @@ def call_local_llm(prompt: str, max_tokens: int = 512, temp: float = 0.2, system
                 raise ValueError("Empty choices in local LLM response")
 
             choice = response['choices'][0]
-            logger.debug(f"[LLM] Local model choice structure: {list(choice.keys())}")
-
-            # Try different possible keys for the text
-            result = ''
-            if 'text' in choice:
-                result = choice['text'].strip()
-            elif 'content' in choice:
-                result = choice['content'].strip()
-            elif 'message' in choice and isinstance(choice['message'], dict):
-                result = choice['message'].get('content', '').strip()
-            elif isinstance(choice, str):
-                result = choice.strip()
+            result = _extract_choice_text(choice)
 
             # If still empty, try to get raw response
             if not result:
                 logger.warning(f"[LLM] Empty text in local model response, full choice: {choice}")
-                logger.debug(f"[LLM] Full local response structure: {list(response.keys())}")
+                logger.debug("[LLM] Full local response structure: %s", list(response))
                 # Try to extract from finish_reason or other fields
                 if 'finish_reason' in choice:
-                    logger.debug(f"[LLM] Local model finish reason: {choice['finish_reason']}")
+                    logger.debug("[LLM] Local model finish reason: %s", choice['finish_reason'])
                 # Use a fallback that indicates the model responded but with empty text
                 result = (
                     "VERDICT: I notice you've been journaling regularly. That's a positive pattern.\n"
@@ -678,22 +772,26 @@ def call_local_llm(prompt: str, max_tokens: int = 512, temp: float = 0.2, system
                     "CONFIDENCE_ESTIMATE: 50"
                 )
 
-            logger.info(
-                f"[LLM] Local completion generated (length: {len(result)} chars, took {elapsed:.2f}s)"
-            )
-            logger.debug(f"[LLM] Local result preview: {result[:200]}...")
+            logger.info("[LLM] Local completion generated (length: %d chars, took %.2fs)", len(result), elapsed)
+            logger.debug("[LLM] Local result preview: %.200s...", result)
             return result
         except Exception as e:
             logger.error(f"[LLM] Error during local completion generation: {e}", exc_info=True)
-            # Try to close and reset the model instance
+            # Clear the model's token/KV state rather than discarding it: a
+            # reload is slow and can only happen in the main thread anyway.
+            # Reset on the inference worker so it can't land in the middle of
+            # another request's completion on the same model
             try:
-                if _model_instance:
-                    del _model_instance
-                    _model_instance = None
-                    _model_path = None
-                    logger.warning("[LLM] Reset local model instance due to error")
+                _inference_pool.submit(model_instance.reset).result()
+                logger.warning("[LLM] Reset local model state due to error")
             except Exception:
-                pass
+                # The instance itself is unusable; drop it so it gets reloaded
+                with _model_lock:
+                    if _model_instance is model_instance:
+                        _model_instance = None
+                        _model_path = None
+                        _model_n_ctx = None
+                logger.warning("[LLM] Discarded local model instance due to error")
             raise
 
     except ImportError:
@@ -702,16 +800,14 @@ def call_local_llm(prompt: str, max_tokens: int = 512, temp: float = 0.2, system
         try:
             from gpt4all import GPT4All
 
-            logger.info(f"[LLM] Loading GPT4All model from {full_model_path.parent}...")
+            logger.info("[LLM] Loading GPT4All model from %s...", full_model_path.parent)
             model = GPT4All(
                 model_name=os.path.basename(full_model_path),
                 model_path=str(full_model_path.parent)
             )
             logger.debug("[LLM] Generating with GPT4All...")
             result = model.generate(prompt, max_tokens=max_tokens, temp=temp)
-            logger.info(
-                f"[LLM] GPT4All completion generated (length: {len(result)} chars)"
-            )
+            logger.info("[LLM] GPT4All completion generated (length: %d chars)", len(result))
             return result
 
         except ImportError:
@@ -731,3 +827,108 @@ def call_local_llm(prompt: str, max_tokens: int = 512, temp: float = 0.2, system
     except Exception as e:
         logger.error(f"[LLM] Error calling local LLM: {e}", exc_info=True)
         raise
+
+
+def _stream_gemini(prompt: str, max_tokens: int, temp: float, system_instruction: str = None):
+    """Yield Gemini response text as it arrives."""
+    logger.info("[LLM] Streaming from Gemini (gemini-2.5-flash) with max_tokens=%s, temp=%s", max_tokens, temp)
+    client = _get_gemini_client()
+    for chunk in client.models.generate_content_stream(
+        model="gemini-2.5-flash",
+        contents=prompt,
+        config=_gemini_request_config(max_tokens, temp, system_instruction),
+    ):
+        text = getattr(chunk, "text", None)
+        if text:
+            yield text
+
+
+def _stream_local(model_instance, prompt: str, max_tokens: int, temp: float):
+    """
+    Yield local completion text as it is generated.
+
+    Generation still runs on the single inference worker (so it is serialized
+    with call_local_llm); chunks are handed back through a queue. Closing the
+    generator early stops generation at the next token.
+    """
+    max_tokens_to_generate = min(max_tokens, 256)
+    completion_prompt, prompt_tokens, context_window = _prepare_local_prompt(
+        model_instance, prompt, max_tokens_to_generate
+    )
+    logger.debug(
+        "[LLM] Streaming completion: ~%d tokens, max_tokens=%d, context_window=%d",
+        prompt_tokens, max_tokens_to_generate, context_window
+    )
+
+    chunks = queue.Queue()
+    cancelled = threading.Event()
+    done = object()
+
+    def produce():
+        try:
+            for chunk in model_instance.create_completion(
+                prompt=completion_prompt,
+                max_tokens=max_tokens_to_generate,
+                temperature=temp,
+                stop=STOP_SEQUENCES,
+                stream=True,
+            ):
+                if cancelled.is_set():
+                    break
+                chunks.put(_extract_choice_text(chunk['choices'][0]))
+        except Exception as e:
+            # Same recovery as call_local_llm: clear token/KV state, keep the model
+            try:
+                model_instance.reset()
+            except Exception:
+                pass
+            chunks.put(e)
+        finally:
+            chunks.put(done)
+
+    _inference_pool.submit(produce)
+    try:
+        while True:
+            item = chunks.get()
+            if item is done:
+                return
+            if isinstance(item, Exception):
+                raise item
+            if item:
+                yield item
+    finally:
+        cancelled.set()
+
+
+def stream_llm(prompt: str, max_tokens: int = 512, temp: float = 0.2, system_instruction: str = None):
+    """
+    Like call_local_llm, but yield the response text in chunks as it is generated.
+
+    Uses Gemini when configured (falling back to the local model if Gemini
+    fails before producing any output), else the loaded local llama model.
+    If no llama model is loaded, the whole call_local_llm result is yielded
+    as a single chunk.
+    """
+    if _using_gemini():
+        produced = False
+        try:
+            for text in _stream_gemini(prompt, max_tokens, temp, system_instruction):
+                produced = True
+                yield text
+            return
+        except Exception:
+            if produced or not _has_local_model():
+                raise
+            logger.warning("[LLM] Falling back to local model after Gemini streaming error", exc_info=True)
+
+    # The local model takes one combined prompt
+    if system_instruction:
+        prompt = f"{system_instruction}\n\n{prompt}"
+
+    model_instance = _model_instance
+    if model_instance is None:
+        # Not loaded (or not llama): let call_local_llm load it or fall back
+        yield call_local_llm(prompt, max_tokens=max_tokens, temp=temp)
+        return
+
+    yield from _stream_local(model_instance, prompt, max_tokens, temp)
@@ -1,7 +1,10 @@
-import json
 import os
+import logging
 from pathlib import Path
 from django.conf import settings
+from .llm_adapter import _get_config
+
+logger = logging.getLogger(__name__)
 
 class LLMClient:
     """Client for local LLM inference."""
@@ -21,8 +24,7 @@ class LLMClient:
             full_path = project_root / model_path
             
             if not full_path.exists():
-                print(f"Warning: Model file not found at {full_path}")
-                print("Falling back to mock responses. Please download a model.")
+                logger.warning("Model file not found at %s; falling back to mock responses. Please download a model.", full_path)
                 self.model = None
                 return
             
@@ -34,24 +36,23 @@ class LLMClient:
                     n_ctx=2048,
                     verbose=False
                 )
-                print(f"Loaded LLM model: {model_path}")
+                logger.info("Loaded LLM model: %s", model_path)
             except ImportError:
-                print("llama-cpp-python not available, trying gpt4all...")
+                logger.info("llama-cpp-python not available, trying gpt4all...")
                 try:
                     from gpt4all import GPT4All
                     self.model = GPT4All(model_name=os.path.basename(full_path), model_path=str(full_path.parent))
-                    print(f"Loaded GPT4All model: {model_path}")
+                    logger.info("Loaded GPT4All model: %s", model_path)
                 except ImportError:
-                    print("Neither llama-cpp-python nor gpt4all available. Using mock responses.")
+                    logger.warning("Neither llama-cpp-python nor gpt4all available. Using mock responses.")
                     self.model = None
         except Exception as e:
-            print(f"Error loading LLM: {e}")
+            logger.error("Error loading LLM: %s", e)
             self.model = None
     
     def _get_config(self):
-        """Load config.json."""
-        with open(settings.CONFIG_FILE, 'r') as f:
-            return json.load(f)
+        """Load config.json (parsed once, re-read only when the file changes)."""
+        return _get_config()
     
     def generate(self, prompt: str, max_tokens: int = 512, temperature: float = 0.2) -> str:
         """Generate text from prompt."""
@@ -82,7 +83,7 @@ class LLMClient:
             else:
                 return self._mock_response(prompt)
         except Exception as e:
-            print(f"LLM generation error: {e}")
+            logger.error("LLM generation error: %s", e)
             return self._mock_response(prompt)
     
     def _mock_response(self, prompt: str) -> str:
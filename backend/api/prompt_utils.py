@@ -3,6 +3,7 @@ Utility functions for prompt management and token estimation.
 Handles context window limits intelligently.
 """
 import logging
+import re
 
 logger = logging.getLogger(__name__)
 
@@ -10,7 +11,8 @@ def estimate_tokens(text: str) -> int:
     """
     Estimate token count from text.
     Rough approximation: 1 token ≈ 4 characters for English text.
-    More accurate for longer texts.
+    More accurate for longer texts. The local model's own tokenizer is
+    applied later, in llm_adapter._prepare_local_prompt.
     """
     # Simple approximation: ~4 chars per token
     # This is conservative and works well for English
@@ -72,11 +74,17 @@ def truncate_prompt_to_fit(
     if len(truncated_context) < len(context):
         # Find a good truncation point
         truncate_at = len(context) - max_context_chars
-        # Look for newline or period near truncation point
-        for i in range(max(0, truncate_at - 100), truncate_at + 100):
-            if i < len(context) and context[i] in ['\n', '.']:
-                truncated_context = context[i+1:].lstrip()
-                break
+        # Prefer the first newline or period after the truncation point (stays
+        # within budget), else the last one shortly before it
+        after = [i for i in (context.find('\n', truncate_at, truncate_at + 100),
+                             context.find('.', truncate_at, truncate_at + 100)) if i != -1]
+        if after:
+            cut = min(after)
+        else:
+            cut = max(context.rfind('\n', max(0, truncate_at - 100), truncate_at),
+                      context.rfind('.', max(0, truncate_at - 100), truncate_at))
+        if cut != -1:
+            truncated_context = context[cut+1:].lstrip()
     
     return f"{system_prompt}\n\n{truncated_context}"
 
@@ -94,19 +102,19 @@ def limit_entries_for_context(
         max_chars_per_entry: Maximum characters per entry summary
         
     Returns:
-        Limited list of entries with summarized text
+        Limited list of entries with summarized text. Truncated entries are
+        shallow copies; the caller's dicts are never modified.
     """
     if len(entries) <= max_entries:
         return entries
     
-    # Take most recent entries
-    limited = entries[:max_entries]
-    
-    # Truncate long free_text in each entry
-    for entry in limited:
-        if 'free_text' in entry and entry['free_text']:
-            if len(entry['free_text']) > max_chars_per_entry:
-                entry['free_text'] = entry['free_text'][:max_chars_per_entry] + "..."
+    # Take most recent entries, truncating long free_text on a copy
+    limited = []
+    for entry in entries[:max_entries]:
+        free_text = entry.get('free_text')
+        if free_text and len(free_text) > max_chars_per_entry:
+            entry = {**entry, 'free_text': free_text[:max_chars_per_entry] + "..."}
+        limited.append(entry)
     
     return limited
 
@@ -124,23 +132,76 @@ def limit_summaries_for_context(
         max_chars_per_summary: Maximum characters per summary
         
     Returns:
-        Limited list of summaries with truncated text
+        Limited list of summaries with truncated text. Truncated summaries are
+        shallow copies; the caller's dicts are never modified.
     """
     if len(summaries) <= max_summaries:
         return summaries
     
     # Take most recent summaries
-    limited = summaries[:max_summaries]
-    
-    # Truncate long verdict/evidence in each summary
-    for summary in limited:
+    limited = []
+    for summary in summaries[:max_summaries]:
         summary_data = summary.get('summary', {})
-        if 'verdict' in summary_data and summary_data['verdict']:
-            if len(summary_data['verdict']) > max_chars_per_summary:
-                summary_data['verdict'] = summary_data['verdict'][:max_chars_per_summary] + "..."
-        # Limit evidence items
-        if 'evidence' in summary_data and summary_data['evidence']:
-            summary_data['evidence'] = summary_data['evidence'][:3]  # Max 3 evidence items
+        changes = {}
+        # Truncate long verdict/evidence
+        verdict = summary_data.get('verdict')
+        if verdict and len(verdict) > max_chars_per_summary:
+            changes['verdict'] = verdict[:max_chars_per_summary] + "..."
+        evidence = summary_data.get('evidence')
+        if evidence and len(evidence) > 3:
+            changes['evidence'] = evidence[:3]  # Max 3 evidence items
+        if changes:
+            summary = {**summary, 'summary': {**summary_data, **changes}}
+        limited.append(summary)
     
     return limited
 
+# One pass over a VERDICT/EVIDENCE/ACTION/CONFIDENCE_ESTIMATE response: each
+# match is a section header or a bullet line (leading whitespace ignored)
+_RESPONSE_LINE_RE = re.compile(
+    r'^[^\S\n]*(?:(?P<key>VERDICT|EVIDENCE:|ACTION:|CONFIDENCE)|(?P<bullet>[-*]))(?P<rest>.*)$',
+    re.MULTILINE | re.IGNORECASE
+)
+_NUMBER_RE = re.compile(r'\d+')
+
+def parse_response_sections(response: str) -> dict:
+    """
+    Pull the labelled sections out of an LLM response.
+    
+    Header matching is case-insensitive; evidence bullets ('-' or '*') count
+    only between EVIDENCE: and the next ACTION:/CONFIDENCE line. Sections
+    that are missing are left empty (confidence_estimate 0).
+    
+    Returns:
+        Dict with verdict, evidence, action and confidence_estimate
+    """
+    result = {
+        'verdict': '',
+        'evidence': [],
+        'action': '',
+        'confidence_estimate': 0
+    }
+    in_evidence = False
+    for match in _RESPONSE_LINE_RE.finditer(response):
+        key = match.group('key')
+        rest = match.group('rest')
+        if key is None:
+            if in_evidence:
+                evidence_text = rest.strip()
+                if evidence_text:
+                    result['evidence'].append(evidence_text)
+            continue
+        key = key.upper()
+        if key == 'VERDICT':
+            result['verdict'] = rest.split(':', 1)[-1].strip()
+        elif key == 'EVIDENCE:':
+            in_evidence = True
+        elif key == 'ACTION:':
+            result['action'] = rest.strip()
+            in_evidence = False
+        else:
+            number = _NUMBER_RE.search(rest.split(':', 1)[-1])
+            if number:
+                result['confidence_estimate'] = min(100, int(number.group()))
+            in_evidence = False
+    return result
@@ -1,5 +1,9 @@
+import hashlib
 import json
 import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 import logging
 from pathlib import Path
@@ -7,26 +11,345 @@ from typing import List, Dict, Any
 from django.conf import settings
 from sentence_transformers import SentenceTransformer
 import faiss
-from .llm_adapter import call_local_llm
+from .llm_adapter import call_local_llm, stream_llm, _get_config
+from .prompt_utils import parse_response_sections
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 logger = logging.getLogger(__name__)
 
+# Loaded SentenceTransformer, shared by every RAGSystem in the process
+_embedding_model = None
+
+# HNSW graph parameters: neighbours per node, and build/search beam widths
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = 64
+
+# Below this many vectors an exact (flat) search is as fast as HNSW, so the
+# graph is only built once the corpus grows past it
+HNSW_MIN_VECTORS = 1000
+
+# Vectors needed before switching the index to int8 (scalar quantized)
+# storage; the quantizer's per-dimension ranges are trained on them
+SQ_MIN_TRAIN = 10000
+# ...and the most it is trained on (an even sample of larger corpora)
+SQ_MAX_TRAIN = 100000
+# Rows per index.add() call when building an index from scratch
+BUILD_ADD_CHUNK = 1024
+
+# Entries buffered by add_entry() before they are embedded in one batch
+ADD_BATCH_SIZE = 64
+# Seconds a smaller batch waits for more entries before it is embedded anyway
+FLUSH_DELAY = 0.5
+# Texts per encode() batch when embedding the whole corpus in rebuild_index()
+REBUILD_BATCH_SIZE = 64
+# Default encode() batch; the device-error retries in _encode_safe drop to 1
+ENCODE_BATCH_SIZE = 32
+# Threads reading entry files; below PARALLEL_READ_MIN files they're read serially
+READ_WORKERS = 16
+PARALLEL_READ_MIN = 64
+# Index additions between writes of the index and metadata to disk
+SAVE_EVERY = 16
+
+# Entry/summary vectors keyed by a hash of their text, so a rebuild only
+# encodes texts that changed (see RAGSystem._embed_texts)
+EMBED_CACHE_FILE = 'embed_cache.npz'
+
+# Query embeddings and LLM answers kept per RAGSystem (least recently used evicted)
+QUERY_EMBEDDING_CACHE_SIZE = 512
+ANSWER_CACHE_SIZE = 128
+
+# FAISS OpenMP threads. The setting is per calling thread, so it is applied
+# right before each build or search: index builds use every core (unless
+# OMP_NUM_THREADS pins it), while a single k=5 query is cheaper on one
+# thread than fanned out across a pool
+BUILD_OMP_THREADS = int(os.environ.get('OMP_NUM_THREADS') or os.cpu_count() or 4)
+QUERY_OMP_THREADS = 1
+
+# torch intra-op threads for encoding. Unlike FAISS builds, torch is left at
+# its default of one thread per physical core (hyperthreads slow its GEMMs)
+# unless OMP_NUM_THREADS or MKL_NUM_THREADS pins a count; 0 keeps the default.
+# Inter-op parallelism is light in a single encoder forward, so it gets half.
+# Applied once per process, the first time the embedding model is loaded
+TORCH_THREADS = int(os.environ.get('OMP_NUM_THREADS') or os.environ.get('MKL_NUM_THREADS') or 0)
+_torch_threads_set = False
+
+
+def _index_type_for(count: int):
+    """FAISS index class suited to a corpus of `count` vectors."""
+    if count >= SQ_MIN_TRAIN:
+        return faiss.IndexHNSWSQ
+    if count >= HNSW_MIN_VECTORS:
+        return faiss.IndexHNSWFlat
+    return faiss.IndexFlatIP
+
+
+def _index_tier(index) -> int:
+    """Position of an existing index's kind in _index_type_for's progression (flat, HNSW, int8 HNSW)."""
+    # downcast_index returns IndexFlat (not IndexFlatIP) for flat indexes, so
+    # compare kinds rather than exact classes
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexHNSWSQ):
+        return 2
+    if isinstance(index, faiss.IndexHNSW):
+        return 1
+    return 0
+
+
+# Index classes in the order _index_type_for moves through them
+INDEX_TIERS = (faiss.IndexFlatIP, faiss.IndexHNSWFlat, faiss.IndexHNSWSQ)
+
+
+def _new_index(dimension: int, index_type=None):
+    """Create an empty index over unit vectors (inner product == cosine); flat by default."""
+    if index_type is faiss.IndexHNSWSQ:
+        index = faiss.IndexHNSWSQ(
+            dimension, faiss.ScalarQuantizer.QT_8bit, HNSW_M, faiss.METRIC_INNER_PRODUCT
+        )
+    elif index_type is faiss.IndexHNSWFlat:
+        index = faiss.IndexHNSWFlat(dimension, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+    else:
+        return faiss.IndexFlatIP(dimension)
+    index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+    index.hnsw.efSearch = HNSW_EF_SEARCH
+    return index
+
+
+def _build_index(vectors):
+    """
+    Index the given unit vectors: exact while small, HNSW, then int8-quantized HNSW.
+    `vectors` is an array or a list of rows; rows are added BUILD_ADD_CHUNK at
+    a time so the whole corpus is never copied into one more array.
+    """
+    index_type = _index_type_for(len(vectors))
+    index = _new_index(len(vectors[0]), index_type)
+    faiss.omp_set_num_threads(BUILD_OMP_THREADS)
+    if index_type is faiss.IndexHNSWSQ:
+        step = (len(vectors) + SQ_MAX_TRAIN - 1) // SQ_MAX_TRAIN
+        index.train(np.stack(vectors[::step]))
+    for start in range(0, len(vectors), BUILD_ADD_CHUNK):
+        index.add(np.stack(vectors[start:start + BUILD_ADD_CHUNK]))
+    return index
+
+
+# Summary file patterns and the type each is tagged with, in load order
+SUMMARY_FILE_TYPES = (
+    ('weekly_*.json', 'week'),
+    ('monthly_*.json', 'month'),
+    ('yearly_*.json', 'year'),
+)
+
+
+QUERY_PROMPT_PATH = Path(__file__).parent.parent / 'prompts' / 'query_prompt.txt'
+
+
+def _load_query_prompt():
+    """
+    Read query_prompt.txt and split it into (system_instruction, user_template).
+    Returns None if the file can't be read (the inline fallback prompt is used).
+    """
+    try:
+        template = QUERY_PROMPT_PATH.read_text()
+    except OSError:
+        return None
+    # Split template into system and user parts
+    if "Context from journal entries:" in template:
+        system_part, user_part = template.split("Context from journal entries:", 1)
+        return system_part.strip(), "Context from journal entries:" + user_part
+    return template, "Context:\n{context}\n\nUser question: {query}\n\nAnswer in the required format."
+
+
+# Read once at import rather than on every query
+_QUERY_PROMPT = _load_query_prompt()
+
+
+def _entry_filename(entry: Dict[str, Any]) -> str:
+    """
+    Name of the file an entry is stored in (<timestamp>Z__<id>.json).
+    Read from '_filename' (set when the entry is indexed) if present; otherwise
+    derived once and stored there, so the context and sources reuse it.
+    """
+    filename = entry.get('_filename')
+    if filename is None:
+        filename = f"{entry.get('timestamp', '').replace(':', '-').split('.')[0]}Z__{entry.get('id', '')}.json"
+        entry['_filename'] = filename
+    return filename
+
+
+def _set_torch_threads():
+    """Apply TORCH_THREADS (and half as many inter-op threads) once; later model reloads leave them alone."""
+    global _torch_threads_set
+    if _torch_threads_set:
+        return
+    import torch
+    if TORCH_THREADS:
+        torch.set_num_threads(TORCH_THREADS)
+    threads = torch.get_num_threads()
+    interop_threads = max(1, threads // 2)
+    try:
+        torch.set_num_interop_threads(interop_threads)
+    except RuntimeError as e:
+        # Only allowed before any inter-op parallel work has run
+        logger.debug(f"[RAG] Could not set torch inter-op threads: {e}")
+    _torch_threads_set = True
+    logger.info(f"[RAG] torch using {threads} threads ({interop_threads} inter-op)")
+
+
+def _entry_day(entry: Dict[str, Any]):
+    """
+    Day an entry was written (date.toordinal()), or None if its timestamp
+    doesn't parse. Parsed once and stored in '_day', like '_filename'.
+    """
+    if '_day' in entry:
+        return entry['_day']
+    from datetime import datetime
+    try:
+        day = datetime.fromisoformat(entry.get('timestamp', '').replace('Z', '+00:00')).date().toordinal()
+    except (TypeError, ValueError, AttributeError):
+        day = None
+    entry['_day'] = day
+    return day
+
+
+def _quantize_embedding_model(model):
+    """
+    Swap the model's Linear layers for dynamically quantized int8 ones (CPU only).
+
+    Encoding runs int8 GEMMs (VNNI where the CPU has it); embeddings drift
+    slightly from the fp32 ones, so rebuild the index after turning this on.
+    Returns the model unchanged if quantization isn't supported here.
+    """
+    import torch
+    try:
+        quantized = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    except Exception as e:
+        logger.warning(f"[RAG] Embedding model quantization unavailable, using fp32: {e}")
+        return model
+    logger.info("[RAG] Quantized embedding model Linear layers to int8")
+    return quantized
+
+
+def _bf16_embedding_model(model):
+    """
+    Cast the model's weights to bfloat16 when the CPU has native bf16 support
+    (AVX512-BF16/AMX), halving the memory traffic of the transformer matmuls.
+
+    Token embeddings are upcast to float32 before pooling, so mean-pooling and
+    the returned vectors stay fp32. Returns the model unchanged if bf16 isn't
+    supported here.
+    """
+    import torch
+    supported = getattr(torch.cpu, '_is_avx512_bf16_supported', None)
+    if supported is None or not supported():
+        logger.info("[RAG] CPU lacks native bf16 support, keeping embedding model in fp32")
+        return model
+
+    def upcast_token_embeddings(module, inputs, features):
+        features['token_embeddings'] = features['token_embeddings'].float()
+        return features
+
+    model.to(torch.bfloat16)
+    # modules[0] is the Transformer; its output feeds the Pooling module
+    model[0].register_forward_hook(upcast_token_embeddings)
+    logger.info("[RAG] Cast embedding model weights to bfloat16")
+    return model
+
+
+def _normalize_query(query_text: str) -> str:
+    """Cache key for a query: case and whitespace don't change the (uncased) embedding."""
+    return ' '.join(query_text.split()).lower()
+
+
+def _item_key(item: Dict[str, Any]):
+    """Identify an indexed entry or summary for the answer cache."""
+    return item.get('_source_file') if item.get('_is_summary') else item.get('id')
+
+
+def _context_sort_key(item: Dict[str, Any]):
+    """Stable position of an entry or summary in the query context."""
+    if item.get('_is_summary'):
+        return (1, item.get('date_range', {}).get('start', ''), item.get('_source_file', ''))
+    return (0, item.get('timestamp', ''), item.get('id', ''))
+
+
+def _read_json(path):
+    """Read and parse a JSON file (uses orjson when available)."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _entry_files() -> List[os.DirEntry]:
+    """Entry files in ENTRIES_DIR, oldest first (names start with the timestamp)."""
+    try:
+        with os.scandir(settings.ENTRIES_DIR) as it:
+            files = [d for d in it if d.name.endswith('.json') and d.is_file()]
+    except FileNotFoundError:
+        return []
+    files.sort(key=lambda d: d.name)
+    return files
+
+
+def _read_entries(dir_entries: List[os.DirEntry]) -> List[Any]:
+    """
+    Parse entry files, in order, reading many at once when there are a lot of them.
+    A file that can't be read yields None (and a warning) instead of an entry.
+    """
+    def read(dir_entry):
+        try:
+            return _read_json(dir_entry.path)
+        except Exception as e:
+            logger.warning(f"Error loading entry {dir_entry.path}: {e}")
+            return None
+
+    if len(dir_entries) < PARALLEL_READ_MIN:
+        return [read(d) for d in dir_entries]
+    with ThreadPoolExecutor(max_workers=READ_WORKERS) as pool:
+        return list(pool.map(read, dir_entries))
+
+
+def _to_unit_vectors(embeddings) -> np.ndarray:
+    """Convert embeddings to a float32 array of L2-normalized rows."""
+    embeddings = np.ascontiguousarray(embeddings, dtype='float32')
+    faiss.normalize_L2(embeddings)
+    return embeddings
+
 class RAGSystem:
     """RAG system for querying journal entries."""
     
     def __init__(self):
-        self.embedding_model = None
+        self.embedding_model = _embedding_model
         self.index = None
         self.entries = []
         self.summaries = []  # Store summaries separately
-        self._load_embedding_model()
+        self._summary_files = {}  # summary filename -> (mtime_ns, parsed summary)
+        self.all_items = []  # Index metadata: entries + summaries, in index order
+        self._pending = []  # Entries added but not yet embedded (see flush)
+        self._unsaved = 0  # Index additions not yet written to disk
+        self._flush_timer = None  # Pending delayed flush() (see add_entry)
+        # Guards the index, its metadata and the caches below. Reentrant because
+        # flush() and rebuild_index() save while holding it
+        self._lock = threading.RLock()
+        # normalized query text -> unit query vector
+        self._query_embeddings = OrderedDict()
+        # (normalized query text, ids of the retrieved items) -> parsed answer
+        self._answers = OrderedDict()
+        if self.embedding_model is None:
+            self._load_embedding_model()
+        self._load_embed_cache()
         self._load_or_create_index()
     
-    def _encode_safe(self, texts):
+    def _encode_safe(self, texts, batch_size: int = ENCODE_BATCH_SIZE):
         """Safely encode texts with error handling for device issues."""
         import torch
         try:
-            with torch.no_grad():
+            with torch.inference_mode():
                 # Use batch_encode for better error handling
                 if isinstance(texts, str):
                     texts = [texts]
@@ -35,7 +358,7 @@ class RAGSystem:
                     convert_to_tensor=False,
                     show_progress_bar=False,
                     normalize_embeddings=False,
-                    batch_size=1  # Process one at a time to avoid memory issues
+                    batch_size=batch_size
                 )
         except (StopIteration, AttributeError, RuntimeError) as e:
             # Device access error - try to fix by ensuring model is on CPU
@@ -58,7 +381,7 @@ class RAGSystem:
                     pass
                 
                 # Retry encoding with even more conservative settings
-                with torch.no_grad():
+                with torch.inference_mode():
                     if isinstance(texts, str):
                         texts = [texts]
                     return self.embedding_model.encode(
@@ -75,7 +398,7 @@ class RAGSystem:
                 try:
                     logger.warning("[RAG] Attempting to reload embedding model as last resort...")
                     self._load_embedding_model()
-                    with torch.no_grad():
+                    with torch.inference_mode():
                         if isinstance(texts, str):
                             texts = [texts]
                         return self.embedding_model.encode(
@@ -89,12 +412,96 @@ class RAGSystem:
                     logger.error(f"[RAG] Model reload also failed: {reload_error}")
                     raise RuntimeError(f"Embedding model error: {error_msg}. Reload failed: {reload_error}")
     
+    def _embed_cache_tag(self) -> str:
+        """Identifies the model settings cached vectors were produced with."""
+        models = self._get_config()['models']
+        tag = f"{models['embedding_model']}|int8={bool(models.get('embedding_quantize'))}"
+        if models.get('embedding_bf16') and not models.get('embedding_quantize'):
+            tag += '|bf16'
+        return tag
+    
+    def _load_embed_cache(self):
+        """Load the text-hash -> unit vector cache (empty if missing or made by another model)."""
+        self._embed_cache = {}
+        self._embed_cache_dirty = False
+        try:
+            with np.load(settings.EMBEDDINGS_DIR / EMBED_CACHE_FILE) as data:
+                if str(data['tag']) != self._embed_cache_tag():
+                    logger.info("[RAG] Embedding cache was built with different model settings, ignoring it")
+                    return
+                self._embed_cache = dict(zip(data['keys'].tolist(), data['vectors']))
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"[RAG] Could not load embedding cache: {e}")
+    
+    def _save_embed_cache(self):
+        """Write the embedding cache next to the index if it changed."""
+        if not self._embed_cache_dirty:
+            return
+        keys = list(self._embed_cache)
+        vectors = np.stack([self._embed_cache[key] for key in keys]) if keys else np.empty((0, 0), dtype='float32')
+        cache_path = settings.EMBEDDINGS_DIR / EMBED_CACHE_FILE
+        with open(str(cache_path) + '.tmp', 'wb') as f:
+            np.savez(f, tag=np.array(self._embed_cache_tag()), keys=np.array(keys, dtype='U64'), vectors=vectors)
+        os.replace(str(cache_path) + '.tmp', cache_path)
+        self._embed_cache_dirty = False
+    
+    def _embed_texts(self, texts: List[str], batch_size: int, prune: bool = False) -> np.ndarray:
+        """
+        Return unit vectors for texts, encoding only those not in the embedding cache.
+        With prune=True the cache is trimmed to exactly these texts (used by rebuild_index).
+        """
+        return np.stack(self._embed_rows(texts, batch_size, prune))
+    
+    def _embed_rows(self, texts: List[str], batch_size: int, prune: bool = False) -> List[np.ndarray]:
+        """Like _embed_texts, but returns the cached row vectors without stacking them."""
+        keys = [hashlib.sha256(text.encode('utf-8')).hexdigest() for text in texts]
+        cache = self._embed_cache
+        missing = [i for i, key in enumerate(keys) if key not in cache]
+        if missing:
+            encoded = _to_unit_vectors(self._encode_safe([texts[i] for i in missing], batch_size=batch_size))
+            for i, vector in zip(missing, encoded):
+                cache[keys[i]] = vector
+            self._embed_cache_dirty = True
+        logger.debug(f"[RAG] Embedded {len(missing)} texts, reused {len(texts) - len(missing)} cached vectors")
+        if prune and len(cache) > len(set(keys)):
+            self._embed_cache = {key: cache[key] for key in keys}
+            self._embed_cache_dirty = True
+        return [cache[key] for key in keys]
+    
+    def _embed_query(self, query_text: str) -> np.ndarray:
+        """Return the (1, dim) unit vector for a query, reusing it for repeated queries."""
+        key = _normalize_query(query_text)
+        with self._lock:
+            embedding = self._query_embeddings.get(key)
+            if embedding is not None:
+                self._query_embeddings.move_to_end(key)
+                return embedding
+        embedding = _to_unit_vectors(self._encode_safe([query_text]))
+        with self._lock:
+            self._query_embeddings[key] = embedding
+            if len(self._query_embeddings) > QUERY_EMBEDDING_CACHE_SIZE:
+                self._query_embeddings.popitem(last=False)
+        return embedding
+    
+    def _remember_answer(self, key, answer: Dict[str, Any], response: str):
+        """Cache an answer for the same query over the same sources (unless the LLM returned nothing usable)."""
+        if not response or len(response.strip()) < 10:
+            return
+        with self._lock:
+            self._answers[key] = answer
+            if len(self._answers) > ANSWER_CACHE_SIZE:
+                self._answers.popitem(last=False)
+    
     def _load_embedding_model(self):
-        """Load the sentence transformer model."""
+        """Load the sentence transformer model (and share it with later instances)."""
+        global _embedding_model
         try:
             import torch
             import logging
             logger = logging.getLogger(__name__)
+            _set_torch_threads()
             
             model_name = self._get_config()['models']['embedding_model']
             logger.info(f"[RAG] Loading embedding model: {model_name}")
@@ -293,17 +700,27 @@ class RAGSystem:
             if not loaded:
                 error_msg = str(last_error) if last_error else "Unknown error"
                 raise RuntimeError(f"Failed to load embedding model after multiple attempts: {error_msg}")
+            models_config = self._get_config()['models']
+            if models_config.get('embedding_quantize'):
+                self.embedding_model = _quantize_embedding_model(self.embedding_model)
+            elif models_config.get('embedding_bf16'):
+                self.embedding_model = _bf16_embedding_model(self.embedding_model)
+            # Run one encode now so the first query doesn't pay for lazy
+            # tokenizer/kernel initialisation (not via _encode_safe, whose
+            # last resort is to call this loader again)
+            try:
+                self.embedding_model.encode(['warmup'], show_progress_bar=False)
+            except Exception as warmup_error:
+                logger.debug(f"[RAG] Embedding model warm-up failed: {warmup_error}")
+            _embedding_model = self.embedding_model
                     
         except Exception as e:
-            import traceback
-            logger.error(f"[RAG] Error loading embedding model: {e}")
-            logger.error(f"[RAG] Traceback: {traceback.format_exc()}")
+            logger.exception(f"[RAG] Error loading embedding model: {e}")
             raise
     
     def _get_config(self):
-        """Load config.json."""
-        with open(settings.CONFIG_FILE, 'r') as f:
-            return json.load(f)
+        """Load config.json (parsed once, re-read only when the file changes)."""
+        return _get_config()
     
     def _load_or_create_index(self):
         """Load existing index or create new one."""
@@ -316,214 +733,287 @@ class RAGSystem:
         if index_path.exists() and entries_path.exists():
             try:
                 self.index = faiss.read_index(str(index_path))
-                with open(entries_path, 'r') as f:
-                    metadata = json.load(f)
-                    # Separate entries and summaries from metadata
-                    self.entries = [item for item in metadata if not item.get('_is_summary', False)]
-                    # Summaries are loaded separately, not from metadata
+                if self.index.metric_type != faiss.METRIC_INNER_PRODUCT:
+                    # Index from before the switch to cosine similarity
+                    raise ValueError("index uses L2 distance over unnormalized embeddings")
+                hnsw = getattr(faiss.downcast_index(self.index), 'hnsw', None)
+                if hnsw is not None:
+                    hnsw.efSearch = HNSW_EF_SEARCH
+                metadata = _read_json(entries_path)
+                self.all_items = metadata
+                # Separate entries and summaries from metadata
+                self.entries = [item for item in metadata if not item.get('_is_summary', False)]
+                # Summaries are loaded separately, not from metadata
                 logger.info(f"Loaded existing index with {len(self.entries)} entries and {len(self.summaries)} summaries")
+                self._add_missing_entries()
             except Exception as e:
                 logger.warning(f"Error loading index: {e}, rebuilding...")
                 self.rebuild_index()
         else:
             self.rebuild_index()
     
+    def _add_missing_entries(self):
+        """Index entry files the saved index doesn't know about (e.g. lost unsaved additions)."""
+        indexed_ids = {entry.get('id') for entry in self.entries}
+        # Entry files are named <timestamp>Z__<id>.json
+        missing = [
+            dir_entry for dir_entry in _entry_files()
+            if dir_entry.name[:-len('.json')].partition('__')[2] not in indexed_ids
+        ]
+        for dir_entry, entry in zip(missing, _read_entries(missing)):
+            if entry is None:
+                continue
+            entry['_is_summary'] = False
+            entry['_filename'] = dir_entry.name
+            self._pending.append(entry)
+        if self._pending:
+            logger.info(f"Indexing {len(self._pending)} entries missing from the saved index")
+            self.flush(save=True)
+    
     def _get_entry_text(self, entry: Dict[str, Any]) -> str:
         """Extract searchable text from an entry."""
-        parts = [
-            f"Emotion: {entry.get('emotion', '')}",
-            f"Energy: {entry.get('energy', '')}",
-            f"Showed up: {entry.get('showed_up', False)}",
-            entry.get('free_text', ''),
-            entry.get('long_reflection', ''),
-        ]
-        if entry.get('derived', {}).get('summary'):
-            parts.append(f"Summary: {entry['derived']['summary']}")
-        return ' '.join(parts)
+        text = (
+            f"Emotion: {entry.get('emotion', '')} Energy: {entry.get('energy', '')} "
+            f"Showed up: {entry.get('showed_up', False)} "
+            f"{entry.get('free_text', '')} {entry.get('long_reflection', '')}"
+        )
+        summary = entry.get('derived', {}).get('summary')
+        if summary:
+            text += f" Summary: {summary}"
+        return text
     
     def _get_summary_text(self, summary: Dict[str, Any]) -> str:
         """Extract searchable text from a summary."""
         summary_data = summary.get('summary', {})
-        stats = summary.get('stats', {})
-        parts = [
-            f"Summary type: {summary.get('type', 'unknown')}",
-            f"Date range: {summary.get('date_range', {}).get('start', '')} to {summary.get('date_range', {}).get('end', '')}",
-            f"Verdict: {summary_data.get('verdict', '')}",
-            ' '.join(summary_data.get('evidence', [])),
-            f"Action: {summary_data.get('action', '')}",
-        ]
+        date_range = summary.get('date_range', {})
+        text = (
+            f"Summary type: {summary.get('type', 'unknown')} "
+            f"Date range: {date_range.get('start', '')} to {date_range.get('end', '')} "
+            f"Verdict: {summary_data.get('verdict', '')} "
+            f"{' '.join(summary_data.get('evidence', []))} "
+            f"Action: {summary_data.get('action', '')}"
+        )
         # Add stats
+        stats = summary.get('stats', {})
         if stats:
-            parts.append(f"Stats: {stats.get('entry_count', 0)} entries, avg energy {stats.get('avg_energy', 0)}/10")
-        return ' '.join(parts)
+            text += f" Stats: {stats.get('entry_count', 0)} entries, avg energy {stats.get('avg_energy', 0)}/10"
+        return text
     
     def _load_summaries(self):
-        """Load week/month/year summaries from summaries directory."""
+        """
+        Load week/month/year summaries from summaries directory.
+        Parsed summaries are kept per file and only re-read when the file's
+        mtime changes, so a rebuild doesn't re-parse every summary.
+        """
         summaries = []
         summaries_dir = settings.SUMMARIES_DIR
+        cache = {}
         
-        # Load week summaries
-        for filepath in sorted(summaries_dir.glob('weekly_*.json')):
-            try:
-                with open(filepath, 'r') as f:
-                    summary = json.load(f)
-                    summary['_source_file'] = filepath.name
-                    summary['_is_summary'] = True
-                    summary['_summary_type'] = 'week'
-                    summaries.append(summary)
-            except Exception as e:
-                logger.warning(f"Error loading week summary {filepath}: {e}")
-                continue
-        
-        # Load month summaries
-        for filepath in sorted(summaries_dir.glob('monthly_*.json')):
-            try:
-                with open(filepath, 'r') as f:
-                    summary = json.load(f)
-                    summary['_source_file'] = filepath.name
-                    summary['_is_summary'] = True
-                    summary['_summary_type'] = 'month'
-                    summaries.append(summary)
-            except Exception as e:
-                logger.warning(f"Error loading month summary {filepath}: {e}")
-                continue
-        
-        # Load year summaries
-        for filepath in sorted(summaries_dir.glob('yearly_*.json')):
-            try:
-                with open(filepath, 'r') as f:
-                    summary = json.load(f)
-                    summary['_source_file'] = filepath.name
-                    summary['_is_summary'] = True
-                    summary['_summary_type'] = 'year'
+        for pattern, summary_type in SUMMARY_FILE_TYPES:
+            for filepath in sorted(summaries_dir.glob(pattern)):
+                try:
+                    mtime = filepath.stat().st_mtime_ns
+                    cached = self._summary_files.get(filepath.name)
+                    if cached is not None and cached[0] == mtime:
+                        summary = cached[1]
+                    else:
+                        summary = _read_json(filepath)
+                        summary['_source_file'] = filepath.name
+                        summary['_is_summary'] = True
+                        summary['_summary_type'] = summary_type
+                    cache[filepath.name] = (mtime, summary)
                     summaries.append(summary)
-            except Exception as e:
-                logger.warning(f"Error loading year summary {filepath}: {e}")
-                continue
+                except Exception as e:
+                    logger.warning(f"Error loading {summary_type} summary {filepath}: {e}")
+                    continue
         
+        # Drop files that no longer exist
+        self._summary_files = cache
         logger.info(f"Loaded {len(summaries)} summaries")
         return summaries
     
     def rebuild_index(self):
         """Rebuild the FAISS index from all entries and summaries."""
-        logger.info("Rebuilding index...")
-        self.entries = []
-        texts = []
-        all_items = []  # Store both entries and summaries for metadata
+        with self._lock:
+            # Held throughout, so a flush on the add_entry timer can't re-add an
+            # entry on top of the rebuilt index
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            logger.info("Rebuilding index...")
+            # Every entry file is re-read below, so buffered additions are covered
+            self._pending = []
+            # Cached answers may rest on entries or summaries that have changed
+            self._answers.clear()
+            self.entries = []
+            texts = []
+            all_items = []  # Store both entries and summaries for metadata
         
-        # Load all entries
-        for filepath in sorted(settings.ENTRIES_DIR.glob('*.json')):
-            try:
-                with open(filepath, 'r') as f:
-                    entry = json.load(f)
-                    entry['_is_summary'] = False
-                    self.entries.append(entry)
-                    all_items.append(entry)
-                    texts.append(self._get_entry_text(entry))
-            except Exception as e:
-                logger.warning(f"Error loading entry {filepath}: {e}")
-                continue
+            # Load all entries
+            dir_entries = _entry_files()
+            for dir_entry, entry in zip(dir_entries, _read_entries(dir_entries)):
+                if entry is None:
+                    continue
+                entry['_is_summary'] = False
+                entry['_filename'] = dir_entry.name
+                self.entries.append(entry)
+                all_items.append(entry)
+                texts.append(self._get_entry_text(entry))
         
-        # Load summaries (for old data)
-        self.summaries = self._load_summaries()
+            # Load summaries (for old data)
+            self.summaries = self._load_summaries()
         
-        # Add summaries to index (prefer summaries for old data)
-        # Strategy: Use summaries for data older than 30 days to save tokens
-        from datetime import datetime, timedelta
-        thirty_days_ago = datetime.now() - timedelta(days=30)
+            # Add summaries to index (prefer summaries for old data)
+            # Strategy: Use summaries for data older than 30 days to save tokens
+            from datetime import datetime, timedelta
+            thirty_days_ago = datetime.now() - timedelta(days=30)
         
-        for summary in self.summaries:
-            date_range = summary.get('date_range', {})
-            end_date_str = date_range.get('end', '')
-            if end_date_str:
-                try:
-                    end_date = datetime.fromisoformat(end_date_str).date()
-                    # Only index summaries for data older than 30 days (token optimization)
-                    if end_date < thirty_days_ago.date():
+            for summary in self.summaries:
+                date_range = summary.get('date_range', {})
+                end_date_str = date_range.get('end', '')
+                if end_date_str:
+                    try:
+                        end_date = datetime.fromisoformat(end_date_str).date()
+                        # Only index summaries for data older than 30 days (token optimization)
+                        if end_date < thirty_days_ago.date():
+                            all_items.append(summary)
+                            texts.append(self._get_summary_text(summary))
+                            logger.debug(f"[RAG] Added summary to index: {summary.get('_source_file', 'unknown')} (old data)")
+                    except Exception:
+                        # If date parsing fails, include it anyway
                         all_items.append(summary)
                         texts.append(self._get_summary_text(summary))
-                        logger.debug(f"[RAG] Added summary to index: {summary.get('_source_file', 'unknown')} (old data)")
-                except Exception:
-                    # If date parsing fails, include it anyway
-                    all_items.append(summary)
-                    texts.append(self._get_summary_text(summary))
-        
-        if not texts:
-            logger.info("No entries or summaries found, creating empty index")
-            # Create empty index with correct dimension
-            dimension = 384  # all-MiniLM-L6-v2 dimension
-            self.index = faiss.IndexFlatL2(dimension)
-            self._save_index(all_items)
-            return
         
-        # Generate embeddings
-        logger.info(f"Generating embeddings for {len(texts)} items ({len(self.entries)} entries + {len([s for s in all_items if s.get('_is_summary')])} summaries)...")
-        embeddings = self._encode_safe(texts)
-        embeddings = np.array(embeddings).astype('float32')
+            if not texts:
+                logger.info("No entries or summaries found, creating empty index")
+                # Create empty index with correct dimension
+                dimension = 384  # all-MiniLM-L6-v2 dimension
+                self.index = _new_index(dimension)
+                self.all_items = all_items
+                self._save_index()
+                return
         
-        # Create FAISS index
-        dimension = embeddings.shape[1]
-        self.index = faiss.IndexFlatL2(dimension)
-        self.index.add(embeddings)
+            # Generate embeddings
+            logger.info(f"Generating embeddings for {len(texts)} items ({len(self.entries)} entries + {len([s for s in all_items if s.get('_is_summary')])} summaries)...")
+            # Rows straight from the embedding cache, added to the index in chunks
+            vectors = self._embed_rows(texts, batch_size=REBUILD_BATCH_SIZE, prune=True)
         
-        self._save_index(all_items)
-        logger.info(f"Index rebuilt with {len(self.entries)} entries and {len([s for s in all_items if s.get('_is_summary')])} summaries")
+            # Create FAISS index
+            self.index = _build_index(vectors)
+        
+            self.all_items = all_items
+            self._save_index()
+            logger.info(f"Index rebuilt with {len(self.entries)} entries and {len([s for s in all_items if s.get('_is_summary')])} summaries")
     
     def _save_index(self, all_items=None):
         """Save index and metadata."""
-        index_path = settings.EMBEDDINGS_DIR / 'faiss_index.bin'
-        entries_path = settings.EMBEDDINGS_DIR / 'entries_metadata.json'
+        with self._lock:
+            index_path = settings.EMBEDDINGS_DIR / 'faiss_index.bin'
+            entries_path = settings.EMBEDDINGS_DIR / 'entries_metadata.json'
         
-        faiss.write_index(self.index, str(index_path))
+            # Write to temp files and swap them in so a crash never leaves a partial file
+            faiss.write_index(self.index, str(index_path) + '.tmp')
+            os.replace(str(index_path) + '.tmp', index_path)
         
-        # Save all items (entries + summaries) to metadata
-        if all_items is None:
-            all_items = self.entries + self.summaries
+            # Save all items (entries + summaries) to metadata
+            if all_items is None:
+                all_items = self.all_items
         
-        with open(entries_path, 'w') as f:
-            json.dump(all_items, f, indent=2)
+            # Internal cache file, so written compactly rather than indented
+            with open(str(entries_path) + '.tmp', 'wb') as f:
+                if orjson is not None:
+                    f.write(orjson.dumps(all_items))
+                else:
+                    f.write(json.dumps(all_items).encode('utf-8'))
+            os.replace(str(entries_path) + '.tmp', entries_path)
+            self._unsaved = 0
+            self._save_embed_cache()
     
-    def add_entry(self, entry: Dict[str, Any]):
-        """Add a single entry to the index incrementally."""
-        entry['_is_summary'] = False
-        text = self._get_entry_text(entry)
-        embedding = self._encode_safe([text])
-        embedding = np.array(embedding).astype('float32')
-        
-        if self.index is None:
-            dimension = embedding.shape[1]
-            self.index = faiss.IndexFlatL2(dimension)
-        
-        self.index.add(embedding)
-        self.entries.append(entry)
+    def add_entry(self, entry: Dict[str, Any], filename: str = None):
+        """
+        Queue an entry for indexing. Entries are embedded in batches by flush(),
+        which runs once ADD_BATCH_SIZE are queued, FLUSH_DELAY seconds after
+        the first of a smaller batch, and before every query.
         
-        # Reload all items for saving
-        entries_path = settings.EMBEDDINGS_DIR / 'entries_metadata.json'
-        all_items = []
-        if entries_path.exists():
+        filename is the entry's file name in ENTRIES_DIR (derived if omitted).
+        The index keeps a copy tagged with internal '_' keys; the caller's
+        dict is left as is.
+        """
+        entry = {**entry, '_is_summary': False}
+        entry['_filename'] = filename or _entry_filename(entry)
+        with self._lock:
+            self._pending.append(entry)
+            if len(self._pending) < ADD_BATCH_SIZE:
+                if self._flush_timer is None:
+                    self._flush_timer = threading.Timer(FLUSH_DELAY, self._delayed_flush)
+                    self._flush_timer.daemon = True
+                    self._flush_timer.start()
+                return
+        self.flush()
+    
+    def _delayed_flush(self):
+        """Timer callback: embed whatever add_entry() has queued since the timer started."""
+        with self._lock:
+            self._flush_timer = None
+        try:
+            self.flush()
+        except Exception:
+            logger.exception("[RAG] Background flush of queued entries failed")
+    
+    def flush(self, save: bool = False):
+        """Embed queued entries in one batch and add them to the index."""
+        with self._lock:
+            if not self._pending:
+                return
+            pending, self._pending = self._pending, []
             try:
-                with open(entries_path, 'r') as f:
-                    all_items = json.load(f)
+                texts = [self._get_entry_text(entry) for entry in pending]
+                embeddings = self._embed_texts(texts, batch_size=ADD_BATCH_SIZE)
+                
+                if self.index is None:
+                    dimension = embeddings.shape[1]
+                    self.index = _new_index(dimension)
+                
+                faiss.omp_set_num_threads(BUILD_OMP_THREADS)
+                self.index.add(embeddings)
             except Exception:
-                all_items = []
+                # Put the batch back so the next flush retries it
+                self._pending[:0] = pending
+                raise
+            index_type = _index_type_for(self.index.ntotal)
+            if INDEX_TIERS.index(index_type) > _index_tier(self.index):
+                # Crossed a size threshold: move to HNSW, or to int8 storage
+                # once there is enough data to train the quantizer
+                logger.info(f"[RAG] Re-indexing {self.index.ntotal} vectors as {index_type.__name__}")
+                self.index = _build_index(self.index.reconstruct_n(0, self.index.ntotal))
+            self.entries.extend(pending)
+            self.all_items.extend(pending)
+            self._unsaved += len(pending)
+            if save or self._unsaved >= SAVE_EVERY:
+                self._save_index()
+    
+    def query(self, query_text: str, k: int = 5, stream: bool = False):
+        """
+        Query the RAG system.
         
-        # Add new entry to all_items
-        all_items.append(entry)
-        self._save_index(all_items)
+        With stream=True, returns a generator of events instead of a dict (see
+        _stream_answer); the early "no entries" replies are yielded as one event.
+        """
+        if stream:
+            result = self._query(query_text, k, stream=True)
+            return iter([result]) if isinstance(result, dict) else result
+        return self._query(query_text, k)
     
-    def query(self, query_text: str, k: int = 5) -> Dict[str, Any]:
-        """Query the RAG system."""
-        # Load all items (entries + summaries) from metadata
-        entries_path = settings.EMBEDDINGS_DIR / 'entries_metadata.json'
-        all_items = []
-        if entries_path.exists():
-            try:
-                with open(entries_path, 'r') as f:
-                    all_items = json.load(f)
-            except Exception:
-                all_items = self.entries + self.summaries
-        else:
-            all_items = self.entries + self.summaries
+    def _query(self, query_text: str, k: int, stream: bool = False):
+        # Make recently added entries searchable
+        try:
+            self.flush()
+        except Exception as e:
+            # Entries stay queued; answer from the current index meanwhile
+            logger.warning(f"[RAG] Could not index queued entries ({type(e).__name__}: {e}), querying the current index")
+            logger.debug("[RAG] Full traceback:", exc_info=True)
+        # Index metadata is kept in memory alongside the index (see _save_index)
+        all_items = self.all_items
         
         if self.index is None or len(all_items) == 0:
             return {
@@ -537,8 +1027,7 @@ class RAGSystem:
         relevant_items = []
         
         try:
-            query_embedding = self._encode_safe([query_text])
-            query_embedding = np.array(query_embedding).astype('float32')
+            query_embedding = self._embed_query(query_text)
             logger.debug(f"[RAG] Query embedded successfully, shape: {query_embedding.shape}")
             
             # Search with embeddings
@@ -550,22 +1039,26 @@ class RAGSystem:
                         'sources': [],
                         'confidence_estimate': 0.0
                     }
-                distances, indices = self.index.search(query_embedding, k)
-                
-                # Get relevant items (entries or summaries) with bounds checking
-                for idx in indices[0]:
-                    if 0 <= idx < len(all_items):
-                        relevant_items.append(all_items[idx])
+                # Under the lock so flush()/rebuild_index() can't change the
+                # index or its metadata mid-search
+                with self._lock:
+                    all_items = self.all_items
+                    faiss.omp_set_num_threads(QUERY_OMP_THREADS)
+                    distances, indices = self.index.search(query_embedding, k)
+                    
+                    # Get relevant items (entries or summaries) with bounds checking
+                    for idx in indices[0]:
+                        if 0 <= idx < len(all_items):
+                            relevant_items.append(all_items[idx])
             except Exception as search_error:
                 logger.warning(f"[RAG] FAISS search error: {search_error}, falling back to recent entries")
                 # Fallback: use most recent entries
                 relevant_items = all_items[:k] if len(all_items) >= k else all_items
         except Exception as e:
-            import traceback
             error_type = type(e).__name__
             error_msg = str(e) if e and str(e) else f"{error_type} occurred"
             logger.warning(f"[RAG] Embedding error ({error_type}): {error_msg}. Using fallback: recent entries.")
-            logger.debug(f"[RAG] Full traceback: {traceback.format_exc()}")
+            logger.debug("[RAG] Full traceback:", exc_info=True)
             
             # Fallback: use most recent entries instead of semantic search
             logger.info("[RAG] Using fallback: returning most recent entries for context")
@@ -588,7 +1081,7 @@ class RAGSystem:
         # Strategy: Prioritize recent entries, use summaries for older data
         # Token optimization: max 1500 chars (~375 tokens) for better 2-3 sentence responses
         from datetime import datetime, timedelta
-        seven_days_ago = datetime.now() - timedelta(days=7)
+        recent_since = (datetime.now() - timedelta(days=7)).date().toordinal()
         
         context_parts = []
         max_context_chars = 1500  # Increased slightly for 2-3 sentence responses
@@ -603,97 +1096,54 @@ class RAGSystem:
             if is_summary:
                 older_summaries.append(item)
             else:
-                # Check if entry is recent
-                try:
-                    entry_date = datetime.fromisoformat(item.get('timestamp', '').replace('Z', '+00:00')).date()
-                    if entry_date >= seven_days_ago.date():
-                        recent_entries.append(item)
-                    else:
-                        # Older entry - prefer summary if available
-                        older_summaries.append(item)
-                except:
+                # Check if entry is recent (entries with unparseable timestamps count as recent)
+                entry_day = _entry_day(item)
+                if entry_day is None or entry_day >= recent_since:
                     recent_entries.append(item)
+                else:
+                    # Older entry - prefer summary if available
+                    older_summaries.append(item)
         
         # Prioritize: recent entries first, then summaries (max 3 summaries to save tokens)
         prioritized_items = recent_entries + older_summaries[:3]
         
         for item in prioritized_items:
-            is_summary = item.get('_is_summary', False)
-            item_text = ""
-            
-            if is_summary:
+            if item.get('_is_summary', False):
                 # Handle summary - concise format (token optimized)
                 summary_type = item.get('_summary_type', 'unknown')
                 date_range = item.get('date_range', {})
                 summary_data = item.get('summary', {})
-                
-                item_text = f"{summary_type.capitalize()} Summary ({date_range.get('start', '')} to {date_range.get('end', '')}): "
-                item_text += f"{summary_data.get('verdict', 'N/A')[:120]}"
                 evidence = summary_data.get('evidence', [])
-                if evidence:
-                    item_text += f" Evidence: {', '.join(evidence[:2])[:100]}"
+                
+                item_text = (
+                    f"{summary_type.capitalize()} Summary ({date_range.get('start', '')} to {date_range.get('end', '')}): "
+                    f"{summary_data.get('verdict', 'N/A')[:120]}"
+                    f"{' Evidence: ' + ', '.join(evidence[:2])[:100] if evidence else ''}"
+                )
             else:
                 # Handle entry - concise format for token optimization
-                entry_date = item.get('timestamp', '')[:10]  # YYYY-MM-DD
-                filename = f"{item.get('timestamp', '').replace(':', '-').split('.')[0]}Z__{item.get('id', '')}.json"
-                item_text = f"Entry {entry_date} ({filename}): {item.get('emotion', 'N/A')}, Energy {item.get('energy', 'N/A')}/10"
-                if item.get('showed_up'):
-                    item_text += ", showed up"
-                if item.get('free_text'):
-                    item_text += f", {item.get('free_text')[:100]}"
+                free_text = item.get('free_text')
+                item_text = (
+                    f"Entry {item.get('timestamp', '')[:10]} ({_entry_filename(item)}): "
+                    f"{item.get('emotion', 'N/A')}, Energy {item.get('energy', 'N/A')}/10"
+                    f"{', showed up' if item.get('showed_up') else ''}"
+                    f"{', ' + free_text[:100] if free_text else ''}"
+                )
             
             # Only add if we haven't exceeded token limit
             if current_length + len(item_text) > max_context_chars:
                 logger.debug(f"[RAG] Context limit reached ({current_length} chars), stopping for token optimization")
                 break
-            context_parts.append(item_text)
+            context_parts.append((_context_sort_key(item), item_text))
             current_length += len(item_text) + 1  # +1 for newline
         
-        context = '\n'.join(context_parts)
+        # Items are picked by relevance above but listed in a fixed order (entries,
+        # then summaries, each by date), so the same retrieved items always give
+        # the same prompt and the LLM's prompt cache can reuse the prefill
+        context_parts.sort(key=lambda part: part[0])
+        context = '\n'.join(item_text for _, item_text in context_parts)
         logger.debug(f"[RAG] Context built: {len(context)} chars (~{len(context) // 4} tokens), {len(recent_entries)} recent entries, {len(older_summaries)} summaries")
         
-        # Generate answer using LLM with token optimization
-        try:
-            config = self._get_config()
-            system_instruction, user_prompt = self._build_query_prompt_optimized(query_text, context, config)
-            
-            try:
-                # Use optimized call with system instruction for Gemini
-                from .llm_adapter import _using_gemini, _call_gemini
-                if _using_gemini():
-                    llm_response = _call_gemini(
-                        prompt=user_prompt,
-                        max_tokens=512,  # Optimized: 512 tokens for 2-3 sentence query responses
-                        temp=0.2,
-                        system_instruction=system_instruction
-                    )
-                else:
-                    # Local model: combine system and user
-                    prompt = f"{system_instruction}\n\n{user_prompt}"
-                    llm_response = call_local_llm(prompt, max_tokens=512, temp=0.2)
-                answer = self._parse_llm_response(llm_response)
-            except Exception as e:
-                import traceback
-                print(f"LLM error: {e}")
-                print(f"LLM traceback: {traceback.format_exc()}")
-                answer = {
-                    'verdict': 'Unable to generate response at this time.',
-                    'evidence': [],
-                    'action': 'Please try again later.',
-                    'confidence_estimate': 0
-                }
-        except Exception as e:
-            import traceback
-            print(f"RAG query processing error: {e}")
-            print(f"Traceback: {traceback.format_exc()}")
-            # Return a basic response if there's an error
-            answer = {
-                'verdict': 'Unable to process query due to a system error.',
-                'evidence': [],
-                'action': 'Please try again later.',
-                'confidence_estimate': 0
-            }
-        
         # Build sources (handle both entries and summaries)
         sources = []
         for item in relevant_items:
@@ -713,17 +1163,66 @@ class RAGSystem:
                 })
             else:
                 # Handle entry source
-                entry_date = item.get('timestamp', '')[:10]
-                filename = f"{item.get('timestamp', '').replace(':', '-').split('.')[0]}Z__{item.get('id', '')}.json"
                 sources.append({
-                    'date': entry_date,
+                    'date': item.get('timestamp', '')[:10],
                     'emotion': item.get('emotion', 'unknown'),
-                    'filename': filename,
+                    'filename': _entry_filename(item),
                     'type': 'entry'
                 })
         
         confidence = min(len(relevant_items) / k, 1.0)
         
+        answer_key = (_normalize_query(query_text), tuple(_item_key(item) for item in relevant_items))
+        with self._lock:
+            answer = self._answers.get(answer_key)
+            if answer is not None:
+                self._answers.move_to_end(answer_key)
+        if answer is not None:
+            logger.debug("[RAG] Reusing cached answer for the same query and sources")
+        
+        if stream:
+            return self._stream_answer(query_text, context, sources, confidence, answer_key, answer)
+        
+        # Generate answer using LLM with token optimization
+        if answer is None:
+            try:
+                config = self._get_config()
+                system_instruction, user_prompt = self._build_query_prompt_optimized(query_text, context, config)
+            
+                try:
+                    # Use optimized call with system instruction for Gemini
+                    from .llm_adapter import _using_gemini, _call_gemini
+                    if _using_gemini():
+                        llm_response = _call_gemini(
+                            prompt=user_prompt,
+                            max_tokens=512,  # Optimized: 512 tokens for 2-3 sentence query responses
+                            temp=0.2,
+                            system_instruction=system_instruction
+                        )
+                    else:
+                        # Local model: combine system and user
+                        prompt = f"{system_instruction}\n\n{user_prompt}"
+                        llm_response = call_local_llm(prompt, max_tokens=512, temp=0.2)
+                    answer = self._parse_llm_response(llm_response)
+                    self._remember_answer(answer_key, answer, llm_response)
+                except Exception as e:
+                    logger.exception(f"[RAG] LLM error: {e}")
+                    answer = {
+                        'verdict': 'Unable to generate response at this time.',
+                        'evidence': [],
+                        'action': 'Please try again later.',
+                        'confidence_estimate': 0
+                    }
+            except Exception as e:
+                logger.exception(f"[RAG] Query processing error: {e}")
+                # Return a basic response if there's an error
+                answer = {
+                    'verdict': 'Unable to process query due to a system error.',
+                    'evidence': [],
+                    'action': 'Please try again later.',
+                    'confidence_estimate': 0
+                }
+        
         return {
             'answer': self._format_answer(answer),
             'sources': sources,
@@ -731,25 +1230,50 @@ class RAGSystem:
             'structured': answer
         }
     
+    def _stream_answer(self, query_text: str, context: str, sources: List[Dict[str, Any]], confidence: float,
+                       answer_key, answer: Dict[str, Any] = None):
+        """
+        Yield a query answer as it is generated.
+        
+        Events, in order: {'sources', 'confidence_estimate'} once; {'delta': text}
+        per chunk of LLM output; and finally {'answer', 'structured'} parsed
+        from the full response, same as the non-streaming query() result.
+        A cached answer skips straight to the final event.
+        """
+        yield {'sources': sources, 'confidence_estimate': confidence}
+        
+        if answer is not None:
+            yield {'answer': self._format_answer(answer), 'structured': answer}
+            return
+        
+        parts = []
+        try:
+            config = self._get_config()
+            system_instruction, user_prompt = self._build_query_prompt_optimized(query_text, context, config)
+            for chunk in stream_llm(user_prompt, max_tokens=512, temp=0.2, system_instruction=system_instruction):
+                parts.append(chunk)
+                yield {'delta': chunk}
+            llm_response = ''.join(parts)
+            answer = self._parse_llm_response(llm_response)
+            self._remember_answer(answer_key, answer, llm_response)
+        except Exception:
+            logger.error("[RAG] Streaming LLM error", exc_info=True)
+            answer = {
+                'verdict': 'Unable to generate response at this time.',
+                'evidence': [],
+                'action': 'Please try again later.',
+                'confidence_estimate': 0
+            }
+        
+        yield {'answer': self._format_answer(answer), 'structured': answer}
+    
     def _build_query_prompt_optimized(self, query: str, context: str, config: Dict) -> tuple:
         """
         Build optimized prompt for query answering.
         Returns (system_instruction, user_prompt) tuple for token-efficient Gemini calls.
         """
-        # Load prompt template
-        prompt_path = Path(__file__).parent.parent / 'prompts' / 'query_prompt.txt'
         try:
-            with open(prompt_path, 'r') as f:
-                template = f.read()
-            # Split template into system and user parts
-            if "Context from journal entries:" in template:
-                parts = template.split("Context from journal entries:", 1)
-                system_instruction = parts[0].strip()
-                user_template = "Context from journal entries:" + parts[1] if len(parts) > 1 else ""
-            else:
-                system_instruction = template
-                user_template = "Context:\n{context}\n\nUser question: {query}\n\nAnswer in the required format."
-            
+            system_instruction, user_template = _QUERY_PROMPT
             user_prompt = user_template.format(context=context, query=query)
             return system_instruction, user_prompt
         except Exception:
@@ -777,48 +1301,15 @@ Be gentle, neutral, use only provided context."""
     
     def _parse_llm_response(self, response: str) -> Dict[str, Any]:
         """Parse LLM response into structured format."""
-        result = {
-            'verdict': '',
-            'evidence': [],
-            'action': '',
-            'confidence_estimate': 0
-        }
-        
         if not response or len(response.strip()) < 10:
-            result['verdict'] = 'Unable to generate response at this time.'
-            return result
-        
-        lines = response.split('\n')
-        current_section = None
+            return {
+                'verdict': 'Unable to generate response at this time.',
+                'evidence': [],
+                'action': '',
+                'confidence_estimate': 0
+            }
         
-        for line in lines:
-            line = line.strip()
-            if not line:
-                continue
-                
-            # More flexible matching for VERDICT
-            if line.upper().startswith('VERDICT:') or line.upper().startswith('VERDICT'):
-                result['verdict'] = line.split(':', 1)[-1].strip() if ':' in line else line.replace('VERDICT', '').strip()
-            elif line.upper().startswith('EVIDENCE:'):
-                current_section = 'evidence'
-            elif line.upper().startswith('ACTION:'):
-                result['action'] = line.split(':', 1)[-1].strip() if ':' in line else line.replace('ACTION', '').strip()
-                current_section = None
-            elif line.upper().startswith('CONFIDENCE_ESTIMATE:') or line.upper().startswith('CONFIDENCE'):
-                try:
-                    conf_str = line.split(':', 1)[-1].strip() if ':' in line else line.replace('CONFIDENCE', '').strip()
-                    # Extract first number found
-                    import re
-                    numbers = re.findall(r'\d+', conf_str)
-                    if numbers:
-                        result['confidence_estimate'] = min(100, max(0, int(numbers[0])))
-                except:
-                    pass
-                current_section = None
-            elif current_section == 'evidence' and (line.startswith('-') or line.startswith('*')):
-                evidence_text = line[1:].strip()
-                if evidence_text:
-                    result['evidence'].append(evidence_text)
+        result = parse_response_sections(response)
         
         # Fallback if parsing fails - try to extract meaningful content
         if not result['verdict']:
@@ -2,19 +2,21 @@ import json
 import os
 import uuid
 import csv
+import threading
 from datetime import datetime, timedelta
 from pathlib import Path
-from django.http import JsonResponse, HttpResponse, Http404
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse, Http404
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.conf import settings
-from .rag_system import RAGSystem
+from .rag_system import RAGSystem, _read_json
 from .entry_processor import EntryProcessor
 from .action_items import create_action, get_actions, update_action, delete_action
-from .llm_adapter import call_local_llm, get_model_context_window, ensure_model_loaded
-from .prompt_utils import truncate_prompt_to_fit
+from .llm_adapter import call_local_llm, get_model_context_window, ensure_model_loaded, _get_config
+from .prompt_utils import truncate_prompt_to_fit, parse_response_sections
 
 rag_system = None
+_rag_lock = threading.Lock()
 last_insight_date = None
 last_insight = None
 _llm_processing = False  # Flag to prevent concurrent LLM calls
@@ -27,7 +29,11 @@ CONFIG_CACHE_TTL = 300  # 5 minutes
 def get_rag_system():
     global rag_system
     if rag_system is None:
-        rag_system = RAGSystem()
+        # AppConfig warms this up in a background thread; requests that arrive
+        # meanwhile wait on the lock instead of building a second instance
+        with _rag_lock:
+            if rag_system is None:
+                rag_system = RAGSystem()
     return rag_system
 
 @csrf_exempt
@@ -54,10 +60,9 @@ def create_entry(request):
             logger.warning(f"[CreateEntry] free_text too long: {len(data['free_text'])} chars")
             return JsonResponse({'error': 'free_text must be <= 200 characters'}, status=400)
         
-        # Validate emotion is in allowed list (load from config)
+        # Validate emotion is in allowed list (from the cached, parsed config)
         try:
-            with open(settings.CONFIG_FILE, 'r') as f:
-                config = json.load(f)
+            config = _get_config()
             allowed_emotions = config.get('emotions', ["content", "anxious", "sad", "angry", "motivated", "tired", "calm", "stressed"])
         except Exception:
             allowed_emotions = ["content", "anxious", "sad", "angry", "motivated", "tired", "calm", "stressed"]
@@ -106,7 +111,7 @@ def create_entry(request):
         # Add to RAG index incrementally
         logger.debug("[CreateEntry] Adding entry to RAG index...")
         rag = get_rag_system()
-        rag.add_entry(entry)
+        rag.add_entry(entry, filename=filename)
         logger.info("[CreateEntry] Entry added to RAG index")
         
         logger.info(f"[CreateEntry] Entry created successfully: {entry_id}")
@@ -140,13 +145,12 @@ def get_entries(request):
         
         for filepath in entry_files[:max_files_to_check]:
             try:
-                with open(filepath, 'r') as f:
-                    entry = json.load(f)
-                    entry_timestamp = datetime.fromisoformat(entry['timestamp'].replace('Z', '+00:00'))
-                    if entry_timestamp.replace(tzinfo=None) >= cutoff_date:
-                        entries.append(entry)
-                    elif len(entries) > 0:  # If we've found entries but this one is too old, we can stop
-                        break
+                entry = _read_json(filepath)
+                entry_timestamp = datetime.fromisoformat(entry['timestamp'].replace('Z', '+00:00'))
+                if entry_timestamp.replace(tzinfo=None) >= cutoff_date:
+                    entries.append(entry)
+                elif len(entries) > 0:  # If we've found entries but this one is too old, we can stop
+                    break
             except Exception as e:
                 logger.debug(f"[GetEntries] Error reading {filepath.name}: {e}")
                 continue
@@ -170,6 +174,13 @@ def query(request):
         
         try:
             rag = get_rag_system()
+            if data.get('stream'):
+                # Newline-delimited JSON events (see RAGSystem._stream_answer)
+                events = rag.query(query_text, stream=True)
+                return StreamingHttpResponse(
+                    (json.dumps(event) + '\n' for event in events),
+                    content_type='application/x-ndjson'
+                )
             result = rag.query(query_text)
             return JsonResponse(result)
         except Exception as rag_error:
@@ -342,11 +353,10 @@ def insight_on_open(request):
         
         for filepath in entry_files:
             try:
-                with open(filepath, 'r') as f:
-                    entry = json.load(f)
-                    entry_timestamp = datetime.fromisoformat(entry['timestamp'].replace('Z', '+00:00'))
-                    if entry_timestamp.replace(tzinfo=None) >= cutoff_date:
-                        entries.append(entry)
+                entry = _read_json(filepath)
+                entry_timestamp = datetime.fromisoformat(entry['timestamp'].replace('Z', '+00:00'))
+                if entry_timestamp.replace(tzinfo=None) >= cutoff_date:
+                    entries.append(entry)
             except Exception as e:
                 logger.debug(f"[Insight] Error reading entry file {filepath.name}: {e}")
                 continue
@@ -608,24 +618,23 @@ def search(request):
         entries = []
         for filepath in sorted(settings.ENTRIES_DIR.glob('*.json'), reverse=True):
             try:
-                with open(filepath, 'r') as f:
-                    entry = json.load(f)
-                    
-                    # Apply filters
-                    if emotion_filter and entry.get('emotion') != emotion_filter:
+                entry = _read_json(filepath)
+                
+                # Apply filters
+                if emotion_filter and entry.get('emotion') != emotion_filter:
+                    continue
+                if habit_filter and not entry.get('habits', {}).get(habit_filter, False):
+                    continue
+                if from_date:
+                    entry_date = entry.get('timestamp', '')[:10]
+                    if entry_date < from_date:
                         continue
-                    if habit_filter and not entry.get('habits', {}).get(habit_filter, False):
+                if to_date:
+                    entry_date = entry.get('timestamp', '')[:10]
+                    if entry_date > to_date:
                         continue
-                    if from_date:
-                        entry_date = entry.get('timestamp', '')[:10]
-                        if entry_date < from_date:
-                            continue
-                    if to_date:
-                        entry_date = entry.get('timestamp', '')[:10]
-                        if entry_date > to_date:
-                            continue
-                    
-                    entries.append(entry)
+                
+                entries.append(entry)
             except Exception:
                 continue
         
@@ -658,8 +667,7 @@ def export_entries(request):
     entries = []
     for filepath in sorted(settings.ENTRIES_DIR.glob('*.json')):
         try:
-            with open(filepath, 'r') as f:
-                entries.append(json.load(f))
+            entries.append(_read_json(filepath))
         except Exception:
             continue
     
@@ -758,49 +766,16 @@ def delete_action_item(request, action_id):
 
 def _parse_llm_response(response: str) -> dict:
     """Parse LLM response into structured format."""
-    result = {
-        'verdict': '',
-        'evidence': [],
-        'action': '',
-        'confidence_estimate': 0
-    }
-    
     if not response or len(response.strip()) < 10:
         # Response too short or empty
-        result['verdict'] = 'Unable to generate insight at this time.'
-        return result
-    
-    lines = response.split('\n')
-    current_section = None
+        return {
+            'verdict': 'Unable to generate insight at this time.',
+            'evidence': [],
+            'action': '',
+            'confidence_estimate': 0
+        }
     
-    for line in lines:
-        line = line.strip()
-        if not line:
-            continue
-            
-        # More flexible matching for VERDICT
-        if line.upper().startswith('VERDICT:') or line.upper().startswith('VERDICT'):
-            result['verdict'] = line.split(':', 1)[-1].strip() if ':' in line else line.replace('VERDICT', '').strip()
-        elif line.upper().startswith('EVIDENCE:'):
-            current_section = 'evidence'
-        elif line.upper().startswith('ACTION:'):
-            result['action'] = line.split(':', 1)[-1].strip() if ':' in line else line.replace('ACTION', '').strip()
-            current_section = None
-        elif line.upper().startswith('CONFIDENCE_ESTIMATE:') or line.upper().startswith('CONFIDENCE'):
-            try:
-                conf_str = line.split(':', 1)[-1].strip() if ':' in line else line.replace('CONFIDENCE', '').strip()
-                # Extract first number found
-                import re
-                numbers = re.findall(r'\d+', conf_str)
-                if numbers:
-                    result['confidence_estimate'] = min(100, max(0, int(numbers[0])))
-            except:
-                pass
-            current_section = None
-        elif current_section == 'evidence' and (line.startswith('-') or line.startswith('*')):
-            evidence_text = line[1:].strip()
-            if evidence_text:
-                result['evidence'].append(evidence_text)
+    result = parse_response_sections(response)
     
     # Fallback if parsing fails - try to extract meaningful content
     if not result['verdict']:
@@ -4,7 +4,9 @@ Integration tests for the journal API.
 import json
 import os
 import sys
+import tempfile
 import unittest
+from unittest import mock
 from pathlib import Path
 from datetime import datetime
 
@@ -135,6 +137,39 @@ class JournalAPITestCase(unittest.TestCase):
         self.assertIn('sources', data)
         self.assertIn('confidence_estimate', data)
     
+    def test_query_stream(self):
+        """Test streaming query returns newline-delimited JSON events."""
+        entry_data = {
+            'emotion': 'calm',
+            'energy': 6,
+            'showed_up': True,
+            'habits': {'exercise': True},
+            'goals': [],
+            'free_text': 'Quiet evening, test stream entry',
+            'long_reflection': ''
+        }
+        create_response = self.client.post(
+            '/api/entry/',
+            data=json.dumps(entry_data),
+            content_type='application/json'
+        )
+        self.assertEqual(create_response.status_code, 201)
+        
+        response = self.client.post(
+            '/api/query/',
+            data=json.dumps({'query': 'How have my evenings been?', 'stream': True}),
+            content_type='application/json'
+        )
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        body = b''.join(response.streaming_content).decode('utf-8')
+        events = [json.loads(line) for line in body.splitlines() if line]
+        self.assertGreater(len(events), 0)
+        self.assertIn('answer', events[-1])
+        self.assertTrue(any('sources' in event for event in events))
+    
     def test_rebuild_index(self):
         """Test rebuilding the index."""
         response = self.client.post('/api/rebuild_index/')
@@ -229,6 +264,101 @@ class JournalAPITestCase(unittest.TestCase):
         self.assertIn('sources', data)
         self.assertIsInstance(data['sources'], list)
 
+    def test_action_items_roundtrip(self):
+        """Test creating, updating, and deleting an action item."""
+        response = self.client.post(
+            '/api/action/',
+            data=json.dumps({'text': 'Test action item'}),
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 201)
+        action_id = json.loads(response.content)['id']
+
+        response = self.client.post(
+            f'/api/action/{action_id}/',
+            data=json.dumps({'completed': True}),
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(json.loads(response.content)['completed'])
+
+        response = self.client.get('/api/actions/?completed=true')
+        ids = [a['id'] for a in json.loads(response.content)['actions']]
+        self.assertIn(action_id, ids)
+
+        response = self.client.delete(f'/api/action/{action_id}/delete/')
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.get('/api/actions/')
+        ids = [a['id'] for a in json.loads(response.content)['actions']]
+        self.assertNotIn(action_id, ids)
+
+
+class ActionItemsLogTestCase(unittest.TestCase):
+    """Test cases for the append-only action items log."""
+    
+    def setUp(self):
+        """Point the action items module at a fresh temporary directory."""
+        from api import action_items
+        self.action_items = action_items
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.tmp = Path(tmp_dir.name)
+        for patcher in (
+            mock.patch.object(action_items, 'ACTIONS_FILE', self.tmp / 'action_items.jsonl'),
+            mock.patch.object(action_items, 'LEGACY_ACTIONS_FILE', self.tmp / 'action_items.json'),
+            mock.patch.dict(action_items._cache, {'mtime': None, 'by_id': None, 'records': 0}),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+    
+    def reload(self):
+        """Forget the in-memory copy and read the actions back from disk."""
+        self.action_items._cache['by_id'] = None
+        return {a['id']: a for a in self.action_items.load_actions()}
+    
+    def test_legacy_file_migrated(self):
+        """Test a legacy action_items.json is read and rewritten as a log."""
+        legacy = [
+            {'id': 'action_1', 'text': 'Old item', 'completed': False},
+            {'id': 'action_2', 'text': 'Done item', 'completed': True},
+        ]
+        with open(self.action_items.LEGACY_ACTIONS_FILE, 'w') as f:
+            json.dump(legacy, f)
+        
+        actions = self.action_items.load_actions()
+        self.assertEqual([a['id'] for a in actions], ['action_1', 'action_2'])
+        self.assertTrue(self.action_items.ACTIONS_FILE.exists())
+        self.assertEqual(self.reload()['action_2']['text'], 'Done item')
+    
+    def test_updates_and_deletes_survive_compaction(self):
+        """Test update and delete records replay correctly across a compaction."""
+        with mock.patch.object(self.action_items, 'COMPACT_RATIO', 1), \
+                mock.patch.object(self.action_items, 'COMPACT_MIN_RECORDS', 3):
+            kept = self.action_items.create_action('Keep me')
+            dropped = self.action_items.create_action('Drop me')
+            self.action_items.update_action(kept['id'], completed=True, text='Kept')
+            self.action_items.delete_action(dropped['id'])
+        
+        with open(self.action_items.ACTIONS_FILE, 'rb') as f:
+            records = [json.loads(line) for line in f if line.strip()]
+        self.assertEqual([r['op'] for r in records], ['create'])
+        
+        actions = self.reload()
+        self.assertEqual(list(actions), [kept['id']])
+        self.assertTrue(actions[kept['id']]['completed'])
+        self.assertEqual(actions[kept['id']]['text'], 'Kept')
+    
+    def test_torn_last_line_skipped(self):
+        """Test a torn last line is skipped and the next append still parses."""
+        first = self.action_items.create_action('Before the crash')
+        with open(self.action_items.ACTIONS_FILE, 'ab') as f:
+            f.write(b'{"op": "create", "act')
+        second = self.action_items.create_action('After the crash')
+        
+        actions = self.reload()
+        self.assertEqual(list(actions), [first['id'], second['id']])
+
 if __name__ == '__main__':
     unittest.main()
 